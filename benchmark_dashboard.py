@@ -0,0 +1,84 @@
+"""
+Benchmark: /data/dashboard latency during a 100-account refresh.
+
+Queues an Instagram refresh for up to N tracked accounts of one user the
+way the refresh sweep does (scheduled lane, one job per username, batched
+enqueue_jobs calls), then keeps calling /data/dashboard (in-process,
+through the ASGI app) while the workers scrape, and prints latency
+percentiles.
+
+Usage:
+    python benchmark_dashboard.py <username> [accounts=100] [seconds=120]
+"""
+import sys
+import time
+import asyncio
+import statistics
+import httpx
+
+from main import app, create_access_token
+from db import db
+from scheduler import scheduler
+from job_queue import PRIORITY_SCHEDULED
+
+ENQUEUE_BATCH = 100  # client IDs per enqueue_jobs call
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run_benchmark(username: str, accounts: int, seconds: int):
+    user = await db.get_user(username, columns='id')
+    if not user:
+        print(f"User '{username}' not found")
+        return
+
+    clients = await db.list_tracked_clients(columns='id, username', user_id=user['id'])
+    client_ids = [c['id'] for c in scheduler._one_per_username(clients[:accounts])]
+    print(f"🧪 Refreshing {len(client_ids)} accounts for {username}...")
+
+    await scheduler.start()
+    created = 0
+    for i in range(0, len(client_ids), ENQUEUE_BATCH):
+        jobs = await scheduler.add_instagram_tasks(
+            client_ids[i:i + ENQUEUE_BATCH],
+            priority=PRIORITY_SCHEDULED
+        )
+        created += sum(1 for job in jobs.values() if job['created'])
+    print(f"   {created} jobs queued in the scheduled lane")
+
+    token = create_access_token(data={"sub": username})
+    headers = {"Authorization": f"Bearer {token}"}
+    latencies = []
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            response = await http.get("/data/dashboard", headers=headers)
+            latencies.append((time.perf_counter() - started) * 1000)
+            response.raise_for_status()
+            await asyncio.sleep(0.5)
+
+    status = await scheduler.get_queue_status()
+    print(f"\n📊 /data/dashboard over {seconds}s ({len(latencies)} requests)")
+    print(f"   p50: {percentile(latencies, 50):.1f} ms")
+    print(f"   p95: {percentile(latencies, 95):.1f} ms")
+    print(f"   p99: {percentile(latencies, 99):.1f} ms")
+    print(f"   max: {max(latencies):.1f} ms")
+    print(f"   mean: {statistics.mean(latencies):.1f} ms")
+    print(f"   queue left: {status}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print(__doc__)
+        sys.exit(1)
+    bench_user = sys.argv[1]
+    bench_accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 100
+    bench_seconds = int(sys.argv[3]) if len(sys.argv) > 3 else 120
+    asyncio.run(run_benchmark(bench_user, bench_accounts, bench_seconds))
@@ -0,0 +1,128 @@
+import os
+import time
+import logging
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Hashable, List, Optional
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+SCRAPE_CACHE_TTL = int(os.getenv("SCRAPE_CACHE_TTL", 1800))  # seconds
+
+
+class TTLCache:
+    """
+    Small in-process cache. Entries expire after `ttl` seconds and the
+    oldest entries are evicted once `maxsize` is reached.
+    """
+
+    def __init__(self, ttl: float, maxsize: int = 10000):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._data.get(key)
+        if entry is None:
+            return default
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return default
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def invalidate(self, key: Hashable):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ScrapeResultCache:
+    """
+    Shared scrape results per Instagram username, so one scrape serves every
+    tenant tracking the same account. Two tiers: in-process TTLCache in front
+    of the `scrape_results` table (survives restarts, shared by processes).
+    Only successful results are cached.
+    """
+
+    def __init__(self, ttl: int = SCRAPE_CACHE_TTL):
+        self.ttl = ttl
+        self.memory = TTLCache(ttl)
+
+    async def get_many(self, kind: str, usernames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Cached results of one kind ('profile', 'posts', 'stories') by username"""
+        found = {}
+        misses = []
+        for username in usernames:
+            hit = self.memory.get((kind, username))
+            if hit is not None:
+                found[username] = hit
+            else:
+                misses.append(username)
+
+        if misses:
+            now = datetime.now(timezone.utc)
+            cutoff = now - timedelta(seconds=self.ttl)
+            try:
+                result = await db.table('scrape_results').select(
+                    'username, result, scraped_at'
+                ).eq('kind', kind).in_('username', misses).gte(
+                    'scraped_at', cutoff.isoformat()
+                ).execute()
+
+                for row in result.data or []:
+                    hit = {**row['result'], 'scraped_at': row['scraped_at']}
+                    found[row['username']] = hit
+                    age = (now - datetime.fromisoformat(row['scraped_at'])).total_seconds()
+                    self.memory.set((kind, row['username']), hit, ttl=max(self.ttl - age, 0))
+            except Exception as e:
+                logger.warning(f"Scrape cache read error: {e}")
+
+        return found
+
+    async def get(self, kind: str, username: str) -> Optional[Dict[str, Any]]:
+        return (await self.get_many(kind, [username])).get(username)
+
+    async def set_many(self, kind: str, results: Dict[str, Dict[str, Any]]):
+        """Store successful results in both tiers"""
+        rows = []
+        scraped_at = datetime.now(timezone.utc).isoformat()
+        for username, result in results.items():
+            if result.get("status") != "success":
+                continue
+            # The result remembers when it was scraped - a cache hit is
+            # as old as this, not as old as the request it serves
+            result = {**result, 'scraped_at': scraped_at}
+            self.memory.set((kind, username), result)
+            rows.append({
+                'username': username,
+                'kind': kind,
+                'result': result,
+                'scraped_at': scraped_at
+            })
+
+        if rows:
+            try:
+                await db.table('scrape_results').upsert(rows, on_conflict='username,kind').execute()
+            except Exception as e:
+                logger.warning(f"Scrape cache write error: {e}")
+
+    async def set(self, kind: str, username: str, result: Dict[str, Any]):
+        await self.set_many(kind, {username: result})
+
+
+# Global instance
+scrape_cache = ScrapeResultCache()
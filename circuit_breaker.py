@@ -0,0 +1,111 @@
+import time
+import logging
+from typing import Any, Dict
+
+from retry import PermanentError
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(PermanentError):
+    """Raised instead of calling a dependency whose breaker is open"""
+
+    reason = "circuit_open"
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"{name} circuit open, retry in {retry_after:.0f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class CircuitBreaker:
+    """
+    Per-dependency circuit breaker.
+    - closed: calls go through; `failure_threshold` consecutive failures open it
+    - open: calls are refused for `recovery_timeout` seconds
+    - half_open: one probe call is let through; success closes the breaker,
+      failure opens it again. Other callers are refused for `probe_wait`
+      seconds at a time, not the whole recovery timeout.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        failure_threshold: int = 5,
+        recovery_timeout: float = 120,
+        probe_wait: float = 5
+    ):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.probe_wait = probe_wait
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._probe_in_flight = False
+
+    def retry_after(self) -> float:
+        """Seconds until an open breaker lets a probe through (0 if not open)"""
+        if self.state != OPEN:
+            return 0.0
+        return max(self.opened_at + self.recovery_timeout - time.monotonic(), 0.0)
+
+    @property
+    def probing(self) -> bool:
+        """A half-open probe call is running"""
+        return self.state == HALF_OPEN and self._probe_in_flight
+
+    def allow(self) -> bool:
+        """Whether a call may go through now (claims the probe when half-open)"""
+        if self.state == OPEN and self.retry_after() <= 0:
+            self.state = HALF_OPEN
+            logger.info(f"🟡 Circuit {self.name} half-open - probing")
+        if self.state == HALF_OPEN:
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+        return self.state == CLOSED
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go through"""
+        if not self.allow():
+            raise CircuitOpenError(self.name, self.retry_after() or self.probe_wait)
+
+    def release(self):
+        """Give back a claimed half-open probe that never ran"""
+        self._probe_in_flight = False
+
+    def on_success(self):
+        if self.state != CLOSED:
+            logger.info(f"🟢 Circuit {self.name} closed")
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self._probe_in_flight = False
+
+    def on_failure(self):
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != OPEN:
+                self.times_opened += 1
+                logger.warning(
+                    f"🔴 Circuit {self.name} open for {self.recovery_timeout:.0f}s "
+                    f"after {self.consecutive_failures} failures"
+                )
+            self.state = OPEN
+            self.opened_at = time.monotonic()
+        self._probe_in_flight = False
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "probing": self.probing,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_after": round(self.retry_after(), 1),
+            "times_opened": self.times_opened
+        }
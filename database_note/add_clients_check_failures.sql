@@ -0,0 +1,18 @@
+-- =====================================================
+-- Alrt AI - Consecutive failed Instagram checks per client
+-- Failed checks (private, deleted, no posts) now record last_check_date
+-- and count up check_failures; the refresh sweep waits
+-- REFRESH_MIN_HOURS * 2^(failures - 1) before trying again.
+-- Run this in Supabase SQL Editor
+-- =====================================================
+
+ALTER TABLE clients
+ADD COLUMN IF NOT EXISTS check_failures INTEGER NOT NULL DEFAULT 0;
+
+-- Clients that already failed count as one failure
+UPDATE clients SET check_failures = 1
+WHERE last_check_status = 'failed' AND check_failures = 0;
+
+-- Verify
+SELECT column_name FROM information_schema.columns
+WHERE table_name = 'clients' AND column_name = 'check_failures';
@@ -0,0 +1,52 @@
+-- =====================================================
+-- Alrt AI - clients.updated_at watermark for dashboard sync
+-- Every client update bumps updated_at, so the dashboard can send
+-- 304 Not Modified or only the rows changed since its last poll
+-- Run this in Supabase SQL Editor (after create_client_stats_rpc.sql)
+-- =====================================================
+
+ALTER TABLE clients
+ADD COLUMN IF NOT EXISTS updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW();
+
+CREATE INDEX IF NOT EXISTS idx_clients_user_updated ON clients(user_id, updated_at);
+
+CREATE OR REPLACE FUNCTION set_updated_at()
+RETURNS TRIGGER
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    NEW.updated_at = NOW();
+    RETURN NEW;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS clients_set_updated_at ON clients;
+CREATE TRIGGER clients_set_updated_at
+BEFORE UPDATE ON clients
+FOR EACH ROW
+EXECUTE FUNCTION set_updated_at();
+
+-- =====================================================
+-- client_signal_stats: now also returns the user's watermark
+-- (latest updated_at of a tracked client)
+-- =====================================================
+DROP FUNCTION IF EXISTS client_signal_stats(BIGINT);
+
+CREATE OR REPLACE FUNCTION client_signal_stats(p_user_id BIGINT)
+RETURNS TABLE(total_tracked BIGINT, green BIGINT, yellow BIGINT, red BIGINT, last_updated TIMESTAMPTZ)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status_signal = 'GREEN'),
+        COUNT(*) FILTER (WHERE status_signal = 'YELLOW'),
+        COUNT(*) FILTER (WHERE status_signal = 'RED'),
+        MAX(updated_at)
+    FROM clients
+    WHERE user_id = p_user_id AND is_tracked = TRUE;
+$$;
+
+-- Verify
+SELECT column_name FROM information_schema.columns
+WHERE table_name = 'clients' AND column_name = 'updated_at';
@@ -0,0 +1,45 @@
+-- =====================================================
+-- Alrt AI - enqueue_jobs also returns the job's user_id
+-- Lets the scheduler push "queued" events to the right user
+-- Run this in Supabase SQL Editor (after add_job_queue_priority.sql)
+-- =====================================================
+
+DROP FUNCTION IF EXISTS enqueue_jobs(TEXT, BIGINT[], INTEGER);
+
+CREATE OR REPLACE FUNCTION enqueue_jobs(
+    p_task_type TEXT,
+    p_client_ids BIGINT[],
+    p_priority INTEGER DEFAULT 1
+)
+RETURNS TABLE(client_id BIGINT, user_id BIGINT, job_id BIGINT, queue_position BIGINT, created BOOLEAN)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_created BIGINT[];
+BEGIN
+    WITH upserted AS (
+        INSERT INTO job_queue (task_type, client_id, user_id, priority)
+        SELECT p_task_type, c.id, c.user_id, p_priority
+        FROM clients c
+        WHERE c.id = ANY(p_client_ids)
+        ORDER BY c.id
+        ON CONFLICT (task_type, client_id) WHERE status = 'pending'
+        DO UPDATE SET priority = LEAST(job_queue.priority, EXCLUDED.priority)
+        RETURNING id, (xmax = 0) AS inserted
+    )
+    SELECT COALESCE(array_agg(id) FILTER (WHERE inserted), '{}') INTO v_created FROM upserted;
+
+    RETURN QUERY
+    SELECT q.client_id, q.user_id, q.id, q.queue_position, q.id = ANY(v_created)
+    FROM (
+        SELECT j.id, j.client_id, j.user_id, ROW_NUMBER() OVER (ORDER BY j.priority, j.id) AS queue_position
+        FROM job_queue j
+        WHERE j.task_type = p_task_type AND j.status = 'pending'
+    ) q
+    WHERE q.client_id = ANY(p_client_ids);
+END;
+$$;
+
+-- Verify
+SELECT routine_name FROM information_schema.routines WHERE routine_name = 'enqueue_jobs';
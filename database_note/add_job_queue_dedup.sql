@@ -0,0 +1,90 @@
+-- =====================================================
+-- Alrt AI - Coalesce duplicate pending jobs
+-- At most one pending job per (task_type, client_id): enqueuing a
+-- client that is already waiting returns the existing job instead
+-- Run this in Supabase SQL Editor (after create_job_queue.sql)
+-- =====================================================
+
+-- Drop duplicates left from before this index existed (keep the oldest)
+DELETE FROM job_queue j
+USING job_queue k
+WHERE j.status = 'pending'
+  AND k.status = 'pending'
+  AND j.task_type = k.task_type
+  AND j.client_id = k.client_id
+  AND j.id > k.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_job_queue_pending_unique
+ON job_queue(task_type, client_id)
+WHERE status = 'pending';
+
+-- =====================================================
+-- enqueue_jobs: add one pending job per client unless one is already
+-- pending. Returns every requested client with its job, its position
+-- in the pending queue of that type and whether the job is new.
+-- =====================================================
+CREATE OR REPLACE FUNCTION enqueue_jobs(
+    p_task_type TEXT,
+    p_client_ids BIGINT[]
+)
+RETURNS TABLE(client_id BIGINT, job_id BIGINT, queue_position BIGINT, created BOOLEAN)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_created BIGINT[];
+BEGIN
+    WITH inserted AS (
+        INSERT INTO job_queue (task_type, client_id)
+        SELECT p_task_type, ids.id
+        FROM (SELECT DISTINCT unnest(p_client_ids) AS id) AS ids
+        ORDER BY ids.id
+        ON CONFLICT (task_type, client_id) WHERE status = 'pending' DO NOTHING
+        RETURNING id
+    )
+    SELECT COALESCE(array_agg(id), '{}') INTO v_created FROM inserted;
+
+    RETURN QUERY
+    SELECT q.client_id, q.id, q.queue_position, q.id = ANY(v_created)
+    FROM (
+        SELECT j.id, j.client_id, ROW_NUMBER() OVER (ORDER BY j.id) AS queue_position
+        FROM job_queue j
+        WHERE j.task_type = p_task_type AND j.status = 'pending'
+    ) q
+    WHERE q.client_id = ANY(p_client_ids);
+END;
+$$;
+
+-- =====================================================
+-- release_jobs: as before, but a released job whose client already
+-- has a newer pending job of the same type is dropped, not retried
+-- =====================================================
+CREATE OR REPLACE FUNCTION release_jobs(
+    p_ids BIGINT[],
+    p_error TEXT,
+    p_delay_seconds INTEGER
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    DELETE FROM job_queue r
+    WHERE r.id = ANY(p_ids)
+      AND r.attempts < r.max_attempts
+      AND EXISTS (
+          SELECT 1 FROM job_queue p
+          WHERE p.task_type = r.task_type
+            AND p.client_id = r.client_id
+            AND p.status = 'pending'
+      );
+
+    UPDATE job_queue
+    SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+        available_at = NOW() + make_interval(secs => p_delay_seconds),
+        leased_until = NULL,
+        lease_owner = NULL,
+        last_error = p_error
+    WHERE id = ANY(p_ids);
+$$;
+
+-- Verify
+SELECT indexname FROM pg_indexes WHERE indexname = 'idx_job_queue_pending_unique';
@@ -0,0 +1,35 @@
+-- =====================================================
+-- Alrt AI - Defer leased jobs without using up an attempt
+-- Used while a dependency's circuit breaker is open: the job goes
+-- back to pending for later and its attempt is given back
+-- Run this in Supabase SQL Editor (after add_job_queue_priority.sql)
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION defer_jobs(
+    p_ids BIGINT[],
+    p_delay_seconds INTEGER
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    -- Another pending job for the same client already covers it
+    DELETE FROM job_queue r
+    WHERE r.id = ANY(p_ids)
+      AND EXISTS (
+          SELECT 1 FROM job_queue p
+          WHERE p.task_type = r.task_type
+            AND p.client_id = r.client_id
+            AND p.status = 'pending'
+      );
+
+    UPDATE job_queue
+    SET status = 'pending',
+        attempts = GREATEST(attempts - 1, 0),
+        available_at = NOW() + make_interval(secs => p_delay_seconds),
+        leased_until = NULL,
+        lease_owner = NULL
+    WHERE id = ANY(p_ids);
+$$;
+
+-- Verify
+SELECT routine_name FROM information_schema.routines WHERE routine_name = 'defer_jobs';
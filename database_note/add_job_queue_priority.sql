@@ -0,0 +1,115 @@
+-- =====================================================
+-- Alrt AI - Job queue priority lanes and tenant fairness
+-- Lanes: 0 = interactive (user clicked), 1 = scheduled (sweeps),
+-- 2 = backfill. Within a lane, jobs are claimed round-robin across
+-- users so one tenant's big batch cannot starve another's single add.
+-- Run this in Supabase SQL Editor (after add_job_queue_dedup.sql)
+-- =====================================================
+
+ALTER TABLE job_queue
+ADD COLUMN IF NOT EXISTS priority SMALLINT NOT NULL DEFAULT 1,
+ADD COLUMN IF NOT EXISTS user_id BIGINT;
+
+UPDATE job_queue j
+SET user_id = c.user_id
+FROM clients c
+WHERE c.id = j.client_id AND j.user_id IS NULL;
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_lane ON job_queue(task_type, priority, user_id, id);
+
+-- =====================================================
+-- enqueue_jobs: as before, plus a lane. Re-enqueuing a pending job in
+-- a more urgent lane moves it up (e.g. a manual refresh during a sweep).
+-- queue_position is the job's place by lane, then age.
+-- =====================================================
+DROP FUNCTION IF EXISTS enqueue_jobs(TEXT, BIGINT[]);
+
+CREATE OR REPLACE FUNCTION enqueue_jobs(
+    p_task_type TEXT,
+    p_client_ids BIGINT[],
+    p_priority INTEGER DEFAULT 1
+)
+RETURNS TABLE(client_id BIGINT, job_id BIGINT, queue_position BIGINT, created BOOLEAN)
+LANGUAGE plpgsql
+AS $$
+#variable_conflict use_column
+DECLARE
+    v_created BIGINT[];
+BEGIN
+    WITH upserted AS (
+        INSERT INTO job_queue (task_type, client_id, user_id, priority)
+        SELECT p_task_type, c.id, c.user_id, p_priority
+        FROM clients c
+        WHERE c.id = ANY(p_client_ids)
+        ORDER BY c.id
+        ON CONFLICT (task_type, client_id) WHERE status = 'pending'
+        DO UPDATE SET priority = LEAST(job_queue.priority, EXCLUDED.priority)
+        RETURNING id, (xmax = 0) AS inserted
+    )
+    SELECT COALESCE(array_agg(id) FILTER (WHERE inserted), '{}') INTO v_created FROM upserted;
+
+    RETURN QUERY
+    SELECT q.client_id, q.id, q.queue_position, q.id = ANY(v_created)
+    FROM (
+        SELECT j.id, j.client_id, ROW_NUMBER() OVER (ORDER BY j.priority, j.id) AS queue_position
+        FROM job_queue j
+        WHERE j.task_type = p_task_type AND j.status = 'pending'
+    ) q
+    WHERE q.client_id = ANY(p_client_ids);
+END;
+$$;
+
+-- =====================================================
+-- claim_jobs: lease up to p_limit jobs of one type - most urgent lane
+-- first, then the n-th job of every user before anyone's (n+1)-th
+-- =====================================================
+CREATE OR REPLACE FUNCTION claim_jobs(
+    p_task_type TEXT,
+    p_limit INTEGER,
+    p_lease_seconds INTEGER,
+    p_owner TEXT
+)
+RETURNS SETOF job_queue
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE job_queue
+    SET status = 'failed', last_error = COALESCE(last_error, 'Lease expired'), lease_owner = NULL
+    WHERE task_type = p_task_type
+      AND status = 'leased'
+      AND leased_until < NOW()
+      AND attempts >= max_attempts;
+
+    RETURN QUERY
+    WITH claimed AS (
+        UPDATE job_queue
+        SET status = 'leased',
+            attempts = attempts + 1,
+            leased_until = NOW() + make_interval(secs => p_lease_seconds),
+            lease_owner = p_owner
+        WHERE id IN (
+            SELECT j.id
+            FROM job_queue j
+            JOIN (
+                SELECT id, priority,
+                       ROW_NUMBER() OVER (PARTITION BY priority, user_id ORDER BY id) AS turn
+                FROM job_queue
+                WHERE task_type = p_task_type
+                  AND (
+                        (status = 'pending' AND available_at <= NOW())
+                     OR (status = 'leased' AND leased_until < NOW())
+                  )
+            ) ranked ON ranked.id = j.id
+            ORDER BY ranked.priority, ranked.turn, j.id
+            LIMIT p_limit
+            FOR UPDATE OF j SKIP LOCKED
+        )
+        RETURNING *
+    )
+    SELECT * FROM claimed ORDER BY priority, id;
+END;
+$$;
+
+-- Verify
+SELECT column_name FROM information_schema.columns
+WHERE table_name = 'job_queue' AND column_name IN ('priority', 'user_id');
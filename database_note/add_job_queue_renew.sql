@@ -0,0 +1,26 @@
+-- =====================================================
+-- Alrt AI - Renew job leases while work is still running
+-- A worker holding jobs longer than JOB_LEASE_SECONDS (slow Apify runs,
+-- retries) extends its lease so the jobs are not re-claimed by another
+-- worker, or failed by claim_jobs, while the first one is still busy.
+-- Run this in Supabase SQL Editor (after add_job_queue_priority.sql)
+-- =====================================================
+
+CREATE OR REPLACE FUNCTION renew_jobs(
+    p_ids BIGINT[],
+    p_owner TEXT,
+    p_lease_seconds INTEGER
+)
+RETURNS SETOF BIGINT
+LANGUAGE sql
+AS $$
+    UPDATE job_queue
+    SET leased_until = NOW() + make_interval(secs => p_lease_seconds)
+    WHERE id = ANY(p_ids)
+      AND status = 'leased'
+      AND lease_owner = p_owner
+    RETURNING id;
+$$;
+
+-- Verify
+SELECT routine_name FROM information_schema.routines WHERE routine_name = 'renew_jobs';
@@ -0,0 +1,22 @@
+-- =====================================================
+-- Alrt AI - Per-user lookup of active jobs
+-- 'queued' / 'processing' are no longer written to clients; the
+-- dashboard reads them from job_queue (JobQueue.active_for_user).
+-- Run this in Supabase SQL Editor (after add_job_queue_priority.sql)
+-- =====================================================
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_user_active
+ON job_queue(user_id)
+WHERE status IN ('pending', 'leased');
+
+-- Clients left on a transient status by earlier versions
+UPDATE clients
+SET last_check_status = 'pending'
+WHERE last_check_status IN ('queued', 'processing')
+  AND NOT EXISTS (
+      SELECT 1 FROM job_queue j
+      WHERE j.client_id = clients.id AND j.task_type = 'instagram'
+  );
+
+-- Verify
+SELECT indexname FROM pg_indexes WHERE indexname = 'idx_job_queue_user_active';
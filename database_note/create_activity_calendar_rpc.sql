@@ -0,0 +1,24 @@
+-- =====================================================
+-- Alrt AI - Atomic activity_calendar increments
+-- One statement per client per job, safe under concurrent workers
+-- Run this in Supabase SQL Editor
+-- =====================================================
+
+-- p_days: [{"activity_date": "2025-12-08", "stories_count": 2, "posts_count": 1}, ...]
+CREATE OR REPLACE FUNCTION increment_activity_calendar(p_client_id BIGINT, p_days JSONB)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    INSERT INTO activity_calendar (client_id, activity_date, stories_count, posts_count, has_activity)
+    SELECT p_client_id, d.activity_date, d.stories_count, d.posts_count, TRUE
+    FROM jsonb_to_recordset(p_days) AS d(activity_date DATE, stories_count INTEGER, posts_count INTEGER)
+    ON CONFLICT (client_id, activity_date) DO UPDATE SET
+        stories_count = COALESCE(activity_calendar.stories_count, 0) + EXCLUDED.stories_count,
+        posts_count = COALESCE(activity_calendar.posts_count, 0) + EXCLUDED.posts_count,
+        has_activity = TRUE;
+$$;
+
+-- Verify the function was created
+SELECT routine_name
+FROM information_schema.routines
+WHERE routine_name = 'increment_activity_calendar';
@@ -0,0 +1,27 @@
+-- =====================================================
+-- Alrt AI - Dashboard stats in one grouped query
+-- Counts a user's tracked clients per status_signal in the
+-- database instead of transferring every row to count in Python
+-- Run this in Supabase SQL Editor
+-- =====================================================
+
+CREATE INDEX IF NOT EXISTS idx_clients_user_tracked ON clients(user_id, is_tracked);
+
+CREATE OR REPLACE FUNCTION client_signal_stats(p_user_id BIGINT)
+RETURNS TABLE(total_tracked BIGINT, green BIGINT, yellow BIGINT, red BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT
+        COUNT(*),
+        COUNT(*) FILTER (WHERE status_signal = 'GREEN'),
+        COUNT(*) FILTER (WHERE status_signal = 'YELLOW'),
+        COUNT(*) FILTER (WHERE status_signal = 'RED')
+    FROM clients
+    WHERE user_id = p_user_id AND is_tracked = TRUE;
+$$;
+
+-- Verify the function was created
+SELECT routine_name
+FROM information_schema.routines
+WHERE routine_name = 'client_signal_stats';
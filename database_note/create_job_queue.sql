@@ -0,0 +1,105 @@
+-- =====================================================
+-- Alrt AI - Durable job queue
+-- Replaces the in-memory asyncio queues: jobs survive restarts,
+-- workers lease jobs in batches and ack/retry them
+-- Run this in Supabase SQL Editor
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS job_queue (
+    id BIGSERIAL PRIMARY KEY,
+    task_type TEXT NOT NULL,                  -- 'instagram' | 'ads' | 'stories' | 'analytics'
+    client_id BIGINT REFERENCES clients(id) ON DELETE CASCADE,
+    status TEXT NOT NULL DEFAULT 'pending',   -- 'pending' | 'leased' | 'failed'
+    attempts INTEGER NOT NULL DEFAULT 0,
+    max_attempts INTEGER NOT NULL DEFAULT 3,
+    available_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    leased_until TIMESTAMPTZ,
+    lease_owner TEXT,
+    last_error TEXT,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_job_queue_claim ON job_queue(task_type, status, available_at, id);
+
+-- =====================================================
+-- claim_jobs: lease up to p_limit jobs of one type.
+-- Claimable = pending and available, or leased with an expired lease
+-- (visibility timeout). Expired leases out of attempts are failed.
+-- =====================================================
+CREATE OR REPLACE FUNCTION claim_jobs(
+    p_task_type TEXT,
+    p_limit INTEGER,
+    p_lease_seconds INTEGER,
+    p_owner TEXT
+)
+RETURNS SETOF job_queue
+LANGUAGE plpgsql
+AS $$
+BEGIN
+    UPDATE job_queue
+    SET status = 'failed', last_error = COALESCE(last_error, 'Lease expired'), lease_owner = NULL
+    WHERE task_type = p_task_type
+      AND status = 'leased'
+      AND leased_until < NOW()
+      AND attempts >= max_attempts;
+
+    RETURN QUERY
+    WITH claimed AS (
+        UPDATE job_queue
+        SET status = 'leased',
+            attempts = attempts + 1,
+            leased_until = NOW() + make_interval(secs => p_lease_seconds),
+            lease_owner = p_owner
+        WHERE id IN (
+            SELECT id FROM job_queue
+            WHERE task_type = p_task_type
+              AND (
+                    (status = 'pending' AND available_at <= NOW())
+                 OR (status = 'leased' AND leased_until < NOW())
+              )
+            ORDER BY id
+            LIMIT p_limit
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING *
+    )
+    SELECT * FROM claimed ORDER BY id;
+END;
+$$;
+
+-- =====================================================
+-- release_jobs: retry leased jobs after p_delay_seconds,
+-- or mark them failed once they are out of attempts
+-- =====================================================
+CREATE OR REPLACE FUNCTION release_jobs(
+    p_ids BIGINT[],
+    p_error TEXT,
+    p_delay_seconds INTEGER
+)
+RETURNS VOID
+LANGUAGE sql
+AS $$
+    UPDATE job_queue
+    SET status = CASE WHEN attempts >= max_attempts THEN 'failed' ELSE 'pending' END,
+        available_at = NOW() + make_interval(secs => p_delay_seconds),
+        leased_until = NULL,
+        lease_owner = NULL,
+        last_error = p_error
+    WHERE id = ANY(p_ids);
+$$;
+
+-- =====================================================
+-- job_queue_sizes: job counts per type and status (monitoring)
+-- =====================================================
+CREATE OR REPLACE FUNCTION job_queue_sizes()
+RETURNS TABLE(task_type TEXT, status TEXT, jobs BIGINT)
+LANGUAGE sql
+STABLE
+AS $$
+    SELECT task_type, status, COUNT(*) FROM job_queue GROUP BY task_type, status;
+$$;
+
+-- Verify
+SELECT routine_name
+FROM information_schema.routines
+WHERE routine_name IN ('claim_jobs', 'release_jobs', 'job_queue_sizes');
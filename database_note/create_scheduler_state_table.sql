@@ -0,0 +1,17 @@
+-- =====================================================
+-- Alrt AI - Scheduler state (persisted job cursors)
+-- Lets long scheduled jobs resume after a restart
+-- Run this in Supabase SQL Editor
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS scheduler_state (
+    key TEXT PRIMARY KEY,
+    value JSONB NOT NULL,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- Verify the table was created
+SELECT column_name, data_type
+FROM information_schema.columns
+WHERE table_name = 'scheduler_state'
+ORDER BY ordinal_position;
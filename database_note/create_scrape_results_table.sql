@@ -0,0 +1,21 @@
+-- =====================================================
+-- Alrt AI - Shared scrape results cache
+-- One scrape per Instagram username, shared by every user tracking it
+-- Run this in Supabase SQL Editor
+-- =====================================================
+
+CREATE TABLE IF NOT EXISTS scrape_results (
+    username TEXT NOT NULL,
+    kind TEXT NOT NULL,               -- 'profile' | 'posts' | 'stories'
+    result JSONB NOT NULL,
+    scraped_at TIMESTAMPTZ DEFAULT NOW(),
+    PRIMARY KEY (username, kind)
+);
+
+CREATE INDEX IF NOT EXISTS idx_scrape_results_scraped_at ON scrape_results(kind, scraped_at);
+
+-- Verify the table was created
+SELECT column_name, data_type
+FROM information_schema.columns
+WHERE table_name = 'scrape_results'
+ORDER BY ordinal_position;
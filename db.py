@@ -0,0 +1,167 @@
+import os
+import httpx
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+from postgrest import AsyncPostgrestClient
+from postgrest.constants import DEFAULT_POSTGREST_CLIENT_HEADERS
+
+from database import SUPABASE_URL, SUPABASE_KEY
+
+# ============================================
+# Connection Pool Configuration
+# ============================================
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 20))
+DB_MAX_KEEPALIVE = int(os.getenv("DB_MAX_KEEPALIVE", 10))
+DB_TIMEOUT = float(os.getenv("DB_TIMEOUT", 30))
+
+
+class _PooledPostgrestClient(AsyncPostgrestClient):
+    """PostgREST client whose session is a pooled HTTP/2 httpx.AsyncClient"""
+
+    def create_session(self, base_url, headers, timeout, verify=True):
+        return httpx.AsyncClient(
+            base_url=base_url,
+            headers=headers,
+            timeout=timeout,
+            verify=verify,
+            follow_redirects=True,
+            http2=True,
+            limits=httpx.Limits(
+                max_connections=DB_MAX_CONNECTIONS,
+                max_keepalive_connections=DB_MAX_KEEPALIVE
+            )
+        )
+
+
+class Database:
+    """
+    Async data-access layer over Supabase (PostgREST).
+    Every call is awaited on the shared connection pool, so database
+    round-trips never block the event loop.
+    """
+
+    def __init__(self, url: str, key: str):
+        self.rest = _PooledPostgrestClient(
+            f"{url}/rest/v1",
+            headers={
+                **DEFAULT_POSTGREST_CLIENT_HEADERS,
+                "apikey": key,
+                "Authorization": f"Bearer {key}"
+            },
+            timeout=DB_TIMEOUT
+        )
+
+    def table(self, name: str):
+        """Query builder for ad-hoc queries: await db.table(...)...execute()"""
+        return self.rest.from_(name)
+
+    def rpc(self, function: str, params: Dict[str, Any]):
+        """Call a Postgres function: await db.rpc(...).execute()"""
+        return self.rest.rpc(function, params)
+
+    async def close(self):
+        await self.rest.aclose()
+
+    # ============================================
+    # Users
+    # ============================================
+    async def get_user(self, username: str, columns: str = '*') -> Optional[Dict[str, Any]]:
+        result = await self.table('users').select(columns).eq('username', username).execute()
+        return result.data[0] if result.data else None
+
+    # ============================================
+    # Clients
+    # ============================================
+    async def get_client(
+        self,
+        client_id: int,
+        columns: str = '*',
+        user_id: Optional[int] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Fetch one client by ID, optionally scoped to its owner"""
+        query = self.table('clients').select(columns).eq('id', client_id)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        result = await query.execute()
+        return result.data[0] if result.data else None
+
+    async def get_client_by_username(
+        self,
+        username: str,
+        user_id: int,
+        columns: str = '*'
+    ) -> Optional[Dict[str, Any]]:
+        result = await self.table('clients').select(columns).eq(
+            'username', username
+        ).eq('user_id', user_id).execute()
+        return result.data[0] if result.data else None
+
+    async def update_client(self, client_id: int, data: Dict[str, Any]) -> None:
+        await self.table('clients').update(data).eq('id', client_id).execute()
+
+    async def get_clients(self, client_ids: List[int], columns: str = '*') -> List[Dict[str, Any]]:
+        """Fetch many clients by ID in one query"""
+        if not client_ids:
+            return []
+        result = await self.table('clients').select(columns).in_('id', client_ids).execute()
+        return result.data or []
+
+    async def update_clients(self, client_ids: List[int], data: Dict[str, Any]) -> None:
+        """Apply the same update to many clients in one query"""
+        if client_ids:
+            await self.table('clients').update(data).in_('id', client_ids).execute()
+
+    async def update_clients_by_username(self, username: str, data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Apply the same update to every tracked client (any user) with this username, returns the rows"""
+        result = await self.table('clients').update(data).eq('username', username).eq('is_tracked', True).execute()
+        return result.data or []
+
+    async def list_tracked_clients(
+        self,
+        columns: str = '*',
+        user_id: Optional[int] = None,
+        username: Optional[str] = None,
+        updated_since: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        All tracked clients, optionally only those of one user or one
+        Instagram username, or only rows updated at/after `updated_since`
+        """
+        query = self.table('clients').select(columns).eq('is_tracked', True)
+        if user_id is not None:
+            query = query.eq('user_id', user_id)
+        if username is not None:
+            query = query.eq('username', username)
+        if updated_since is not None:
+            query = query.gte('updated_at', updated_since)
+        result = await query.execute()
+        return result.data or []
+
+    async def get_client_stats(self, user_id: int) -> Dict[str, Any]:
+        """
+        Tracked client counts per status_signal for one user (one grouped
+        query), plus last_updated - the latest updated_at among them
+        """
+        result = await self.rpc('client_signal_stats', {'p_user_id': user_id}).execute()
+        if result.data:
+            return result.data[0]
+        return {'total_tracked': 0, 'green': 0, 'yellow': 0, 'red': 0, 'last_updated': None}
+
+    # ============================================
+    # Scheduler State
+    # ============================================
+    async def get_state(self, key: str) -> Optional[Dict[str, Any]]:
+        """Persisted scheduler state (e.g. job cursors) by key"""
+        result = await self.table('scheduler_state').select('value').eq('key', key).execute()
+        return result.data[0]['value'] if result.data else None
+
+    async def set_state(self, key: str, value: Dict[str, Any]) -> None:
+        await self.table('scheduler_state').upsert({
+            'key': key,
+            'value': value,
+            'updated_at': datetime.now(timezone.utc).isoformat()
+        }, on_conflict='key').execute()
+
+
+# Global instance
+db = Database(SUPABASE_URL, SUPABASE_KEY)
@@ -0,0 +1,78 @@
+import asyncio
+import logging
+from collections import defaultdict
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set
+
+logger = logging.getLogger(__name__)
+
+
+class EventBus:
+    """
+    In-process pub/sub for job progress, keyed by user ID.
+    Each subscriber (one open SSE stream) gets its own bounded queue; when
+    a slow client falls behind, its oldest events are dropped so workers
+    never block on publish.
+    """
+
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self._subscribers: Dict[int, Set[asyncio.Queue]] = defaultdict(set)
+        self.published = 0
+        self.dropped = 0
+
+    def subscribe(self, user_id: int) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers[user_id].add(queue)
+        return queue
+
+    def unsubscribe(self, user_id: int, queue: asyncio.Queue):
+        subscribers = self._subscribers.get(user_id)
+        if subscribers is not None:
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[user_id]
+
+    def publish(self, user_id: Optional[int], event: Dict[str, Any]):
+        """Send an event to every open stream of one user"""
+        if user_id is None:
+            return
+        event.setdefault("at", datetime.utcnow().isoformat())
+        for queue in self._subscribers.get(user_id, ()):
+            if queue.full():
+                queue.get_nowait()
+                self.dropped += 1
+            queue.put_nowait(event)
+        self.published += 1
+
+    def publish_job(
+        self,
+        user_id: Optional[int],
+        client_id: int,
+        task_type: str,
+        status: str,
+        fields: Optional[Dict[str, Any]] = None
+    ):
+        """
+        Job state transition for one client. `fields` holds the client
+        columns that changed, so the dashboard can patch its row in place.
+        """
+        self.publish(user_id, {
+            "client_id": client_id,
+            "task_type": task_type,
+            "status": status,
+            "fields": fields or {}
+        })
+
+    def publish_many(self, rows: Iterable[Dict[str, Any]], task_type: str, status: str, fields: Dict[str, Any]):
+        """The same transition for many client rows ({'id', 'user_id'})"""
+        for row in rows:
+            self.publish_job(row.get('user_id'), row['id'], task_type, status, fields)
+
+    def metrics(self) -> Dict[str, int]:
+        return {
+            "users_connected": len(self._subscribers),
+            "streams": sum(len(s) for s in self._subscribers.values()),
+            "published": self.published,
+            "dropped": self.dropped
+        }
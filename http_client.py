@@ -0,0 +1,135 @@
+import os
+import logging
+import httpx
+from typing import Any, AsyncIterator, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# ============================================
+# Outbound HTTP Pool Configuration
+# ============================================
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 50))
+HTTP_MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 30))
+
+
+class _MeteredStream(httpx.AsyncByteStream):
+    """Response body that reports when it is closed (connection handed back)"""
+
+    def __init__(self, stream: httpx.AsyncByteStream, on_close: Callable[[], None]):
+        self._stream = stream
+        self._on_close = on_close
+
+    async def __aiter__(self) -> AsyncIterator[bytes]:
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if self._on_close is not None:
+                self._on_close()
+                self._on_close = None
+
+
+class _MeteredTransport(httpx.AsyncBaseTransport):
+    """
+    HTTP transport that counts requests in flight - from send until the
+    response body is closed, or until the request fails (connect errors,
+    timeouts, cancellation), so the count can only go back down.
+    """
+
+    def __init__(self, pool: "SharedHttpClient", **kwargs):
+        self._pool = pool
+        self._transport = httpx.AsyncHTTPTransport(**kwargs)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self._pool._request_started()
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self._pool._request_finished(failed=True)
+            raise
+        return httpx.Response(
+            status_code=response.status_code,
+            headers=response.headers,
+            stream=_MeteredStream(response.stream, self._pool._request_finished),
+            extensions=response.extensions
+        )
+
+    async def aclose(self):
+        await self._transport.aclose()
+
+
+class SharedHttpClient:
+    """
+    App-lifetime, HTTP/2, connection-pooled httpx.AsyncClient shared by the
+    image proxy and thumbnail downloads, so images reuse TCP/TLS connections
+    to the Instagram CDN instead of opening one per request.
+    Started/closed by the app lifecycle; created lazily when used elsewhere.
+    """
+
+    def __init__(self):
+        self._client: Optional[httpx.AsyncClient] = None
+        self.requests_total = 0
+        self.responses_total = 0
+        self.errors_total = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def start(self) -> httpx.AsyncClient:
+        if self._client is None or self._client.is_closed:
+            self._client = httpx.AsyncClient(
+                timeout=HTTP_TIMEOUT,
+                follow_redirects=True,
+                transport=_MeteredTransport(
+                    self,
+                    http2=True,
+                    limits=httpx.Limits(
+                        max_connections=HTTP_MAX_CONNECTIONS,
+                        max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY
+                    )
+                )
+            )
+            logger.info(f"🌐 HTTP pool started (max {HTTP_MAX_CONNECTIONS} connections)")
+        return self._client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self.start()
+
+    async def close(self):
+        if self._client is not None and not self._client.is_closed:
+            await self._client.aclose()
+        self._client = None
+
+    def _request_started(self):
+        self.requests_total += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def _request_finished(self, failed: bool = False):
+        if failed:
+            self.errors_total += 1
+        else:
+            self.responses_total += 1
+        self.in_flight -= 1
+
+    def metrics(self) -> Dict[str, Any]:
+        """Pool usage for sizing HTTP_MAX_CONNECTIONS / HTTP_MAX_KEEPALIVE"""
+        return {
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive": HTTP_MAX_KEEPALIVE,
+            "in_flight": self.in_flight,
+            "peak_in_flight": self.peak_in_flight,
+            "requests_total": self.requests_total,
+            "responses_total": self.responses_total,
+            "errors_total": self.errors_total
+        }
+
+
+# Global instance
+http_pool = SharedHttpClient()
@@ -0,0 +1,313 @@
+import os
+import uuid
+import asyncio
+import hashlib
+import logging
+import aiofiles
+import httpx
+from collections import OrderedDict
+from typing import Any, AsyncIterator, Dict, Optional, Set, Tuple, Union
+
+logger = logging.getLogger(__name__)
+
+MB = 1024 * 1024
+
+# ============================================
+# Image Cache Configuration
+# ============================================
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR", ".image_cache")
+IMAGE_CACHE_MEMORY_BYTES = int(float(os.getenv("IMAGE_CACHE_MEMORY_MB", 32)) * MB)
+IMAGE_CACHE_DISK_BYTES = int(float(os.getenv("IMAGE_CACHE_DISK_MB", 512)) * MB)
+IMAGE_CACHE_MAX_ITEM_BYTES = int(float(os.getenv("IMAGE_CACHE_MAX_ITEM_MB", 1)) * MB)
+IMAGE_FETCH_TIMEOUT = float(os.getenv("IMAGE_FETCH_TIMEOUT", 30))  # seconds a request waits on a fill
+
+
+class ImageCache:
+    """
+    Server-side cache for proxied images, keyed by URL hash.
+    - Memory tier: LRU of hot images (avatars), bounded by total bytes.
+    - Disk tier: one file per image, oldest-used evicted past a size budget.
+      Opened on first use; if the directory cannot be used (read-only or
+      ephemeral filesystem) the cache runs memory-only.
+    - Misses are filled by a background task that writes to disk while the
+      requesting client is streamed the same chunks.
+    - Concurrent requests for the same URL share one upstream fetch and wait
+      at most IMAGE_FETCH_TIMEOUT seconds for it.
+    """
+
+    def __init__(
+        self,
+        directory: str = IMAGE_CACHE_DIR,
+        memory_bytes: int = IMAGE_CACHE_MEMORY_BYTES,
+        disk_bytes: int = IMAGE_CACHE_DISK_BYTES,
+        max_item_bytes: int = IMAGE_CACHE_MAX_ITEM_BYTES
+    ):
+        self.directory = directory
+        self.max_memory_bytes = memory_bytes
+        self.max_disk_bytes = disk_bytes
+        self.max_item_bytes = max_item_bytes
+
+        self._memory: "OrderedDict[str, Tuple[str, bytes]]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()  # key -> size, LRU order
+        self._disk_bytes = 0
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self.disk_enabled: Optional[bool] = None  # None until the disk tier is opened
+
+    def _ensure_disk(self) -> bool:
+        """Open the disk tier once; False (memory-only) if the filesystem refuses"""
+        if self.disk_enabled is None:
+            try:
+                self._load_disk_index()
+                self.disk_enabled = True
+            except OSError as e:
+                logger.warning(f"Image cache disk tier disabled ({self.directory}): {e}")
+                self._disk.clear()
+                self._disk_bytes = 0
+                self.disk_enabled = False
+        return self.disk_enabled
+
+    @staticmethod
+    def key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.img")
+
+    def _load_disk_index(self):
+        """Rebuild the disk LRU from files left by a previous run (oldest first)"""
+        os.makedirs(self.directory, exist_ok=True)
+        entries = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.endswith(".tmp"):
+                os.remove(path)
+            elif name.endswith(".img"):
+                stat = os.stat(path)
+                entries.append((stat.st_mtime, name[:-4], stat.st_size))
+
+        for _, key, size in sorted(entries):
+            self._disk[key] = size
+            self._disk_bytes += size
+        self._evict_disk()
+
+    # ============================================
+    # Tiers
+    # ============================================
+    def _remember(self, key: str, content_type: str, body: bytes):
+        if len(body) > self.max_item_bytes:
+            return
+        if key in self._memory:
+            self._memory_bytes -= len(self._memory.pop(key)[1])
+        self._memory[key] = (content_type, body)
+        self._memory_bytes += len(body)
+        while self._memory_bytes > self.max_memory_bytes and self._memory:
+            _, (_, evicted) = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+
+    def _evict_disk(self):
+        while self._disk_bytes > self.max_disk_bytes and self._disk:
+            key, size = self._disk.popitem(last=False)
+            self._disk_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    async def get(self, key: str) -> Optional[Tuple[str, bytes]]:
+        """(content_type, body) from memory or disk, or None"""
+        cached = self._memory.get(key)
+        if cached is not None:
+            self._memory.move_to_end(key)
+            self.memory_hits += 1
+            return cached
+
+        if self._ensure_disk() and key in self._disk:
+            try:
+                async with aiofiles.open(self._path(key), "rb") as f:
+                    data = await f.read()
+            except OSError:
+                self._disk_bytes -= self._disk.pop(key, 0)
+                return None
+
+            header, _, body = data.partition(b"\n")
+            content_type = header.decode("utf-8")
+            self._disk.move_to_end(key)
+            self._remember(key, content_type, body)
+            self.disk_hits += 1
+            return content_type, body
+
+        return None
+
+    # ============================================
+    # Fetching
+    # ============================================
+    async def fetch(
+        self,
+        url: str,
+        client: httpx.AsyncClient,
+        headers: Dict[str, str]
+    ) -> Tuple[str, Union[bytes, AsyncIterator[bytes]]]:
+        """
+        Return (content_type, body). body is bytes on a cache hit, or an
+        async iterator relaying the upstream response on a miss.
+        Raises on upstream errors and after IMAGE_FETCH_TIMEOUT seconds
+        without a response.
+        """
+        key = self.key(url)
+        cached = await self.get(key)
+        if cached is not None:
+            return cached
+
+        # Another request is already fetching this URL - wait for it
+        pending = self._inflight.get(key)
+        if pending is not None:
+            self.coalesced += 1
+            try:
+                ok = await asyncio.wait_for(asyncio.shield(pending), timeout=IMAGE_FETCH_TIMEOUT)
+            except asyncio.TimeoutError:
+                raise httpx.TimeoutException("Timed out waiting for a shared image fetch")
+            if not ok:
+                raise httpx.HTTPError("Upstream fetch failed")
+            cached = await self.get(key)
+            if cached is not None:
+                return cached
+
+        self.misses += 1
+        loop = asyncio.get_running_loop()
+        done = loop.create_future()
+        content_type = loop.create_future()
+        content_type.add_done_callback(lambda f: f.cancelled() or f.exception())  # mark retrieved
+        chunks: asyncio.Queue = asyncio.Queue()
+        self._inflight[key] = done
+
+        # The fill runs in its own task, so a client that disconnects (or
+        # never starts reading) cannot leave the fetch or the cache entry
+        # half done; the request only relays what the task downloads.
+        task = asyncio.create_task(self._fill(key, url, client, headers, done, content_type, chunks))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        try:
+            media_type = await asyncio.wait_for(asyncio.shield(content_type), timeout=IMAGE_FETCH_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise httpx.TimeoutException("Timed out waiting for the image")
+        return media_type, self._relay(chunks)
+
+    async def _fill(
+        self,
+        key: str,
+        url: str,
+        client: httpx.AsyncClient,
+        headers: Dict[str, str],
+        done: asyncio.Future,
+        content_type: asyncio.Future,
+        chunks: asyncio.Queue
+    ):
+        """Download one image to disk (and memory), handing chunks to the requester"""
+        use_disk = self._ensure_disk()
+        tmp_path = os.path.join(self.directory, f"{key}.{uuid.uuid4().hex}.tmp")
+        body = []
+        size = 0
+        complete = False
+        error: Optional[BaseException] = None
+        try:
+            async with client.stream("GET", url, headers=headers) as response:
+                response.raise_for_status()
+                media_type = response.headers.get("content-type", "image/jpeg")
+                content_type.set_result(media_type)
+                if use_disk:
+                    async with aiofiles.open(tmp_path, "wb") as f:
+                        await f.write(media_type.encode("utf-8") + b"\n")
+                        async for chunk in response.aiter_bytes():
+                            size += len(chunk)
+                            if size <= self.max_item_bytes:
+                                body.append(chunk)
+                            await f.write(chunk)
+                            chunks.put_nowait(chunk)
+                else:
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size <= self.max_item_bytes:
+                            body.append(chunk)
+                        chunks.put_nowait(chunk)
+            complete = True
+        except asyncio.CancelledError:
+            error = httpx.HTTPError("Image fetch cancelled")
+            if not content_type.done():
+                content_type.set_exception(error)
+            raise
+        except Exception as e:
+            error = e
+            logger.warning(f"Image fetch failed: {e}")
+            if not content_type.done():
+                content_type.set_exception(e)
+        finally:
+            # No awaits here - waiters are released whatever happened
+            chunks.put_nowait(error)
+            try:
+                if complete:
+                    if use_disk:
+                        os.replace(tmp_path, self._path(key))
+                        self._disk_bytes -= self._disk.pop(key, 0)
+                        self._disk[key] = size
+                        self._disk_bytes += size
+                        self._evict_disk()
+                    if size <= self.max_item_bytes:
+                        self._remember(key, content_type.result(), b"".join(body))
+                elif use_disk:
+                    try:
+                        os.remove(tmp_path)
+                    except OSError:
+                        pass
+            finally:
+                self._finish(key, done, complete)
+
+    @staticmethod
+    async def _relay(chunks: asyncio.Queue) -> AsyncIterator[bytes]:
+        """Yield the chunks of a fill until it ends; re-raise if it failed"""
+        while True:
+            chunk = await chunks.get()
+            if isinstance(chunk, bytes):
+                yield chunk
+            elif chunk is None:
+                return
+            else:
+                raise httpx.HTTPError(f"Upstream fetch failed: {chunk}")
+
+    def _finish(self, key: str, future: asyncio.Future, ok: bool):
+        if self._inflight.get(key) is future:
+            del self._inflight[key]
+        if not future.done():
+            future.set_result(ok)
+
+    async def close(self):
+        """Cancel fills still running at shutdown"""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "memory_items": len(self._memory),
+            "memory_bytes": self._memory_bytes,
+            "disk_enabled": self.disk_enabled,
+            "disk_items": len(self._disk),
+            "disk_bytes": self._disk_bytes,
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight)
+        }
+
+
+# Global instance
+image_cache = ImageCache()
@@ -0,0 +1,184 @@
+import os
+import time
+import socket
+import asyncio
+import logging
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List
+
+from db import db
+
+logger = logging.getLogger(__name__)
+
+JOB_LEASE_SECONDS = int(os.getenv("JOB_LEASE_SECONDS", 900))  # visibility timeout
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", 5))  # seconds between empty claims
+JOB_RETRY_DELAY = int(os.getenv("JOB_RETRY_DELAY", 60))  # seconds before a failed job is retried
+
+# Priority lanes - lower is claimed first (database_note/add_job_queue_priority.sql)
+PRIORITY_INTERACTIVE = 0  # user is waiting (add, manual refresh)
+PRIORITY_SCHEDULED = 1    # periodic sweeps
+PRIORITY_BACKFILL = 2     # follow-up work nobody is waiting on
+
+
+class JobQueue:
+    """
+    Durable job queue on the `job_queue` table (database_note/create_job_queue.sql).
+    - enqueue() inserts jobs; capacity is not bound by process memory.
+    - claim() leases a batch of jobs for JOB_LEASE_SECONDS, most urgent lane
+      first and round-robin across users within a lane. A job whose lease
+      expires (worker crashed, process restarted) becomes claimable again.
+    - keep_leased() renews the lease while a worker is still busy, so slow
+      jobs are not handed to a second worker.
+    - ack() deletes finished jobs, nack() retries them later or marks them
+      failed once max_attempts is reached.
+    Local enqueues wake idle workers at once; other processes are picked up
+    by polling every JOB_POLL_INTERVAL seconds.
+    """
+
+    SIZES_TTL = 5  # seconds to cache job_queue_sizes()
+
+    def __init__(self):
+        self.owner = f"{socket.gethostname()}-{os.getpid()}"
+        self._wakeups: Dict[str, asyncio.Event] = defaultdict(asyncio.Event)
+        self._sizes: Dict[str, Dict[str, int]] = {}
+        self._sizes_at = 0.0
+
+    async def enqueue(
+        self,
+        task_type: str,
+        client_ids: List[int],
+        priority: int = PRIORITY_SCHEDULED
+    ) -> Dict[int, Dict[str, Any]]:
+        """
+        Add one job per client ID in a priority lane. A client that already
+        has a pending job of this type is not queued twice - the existing job
+        only moves to the more urgent lane (database_note/add_job_queue_dedup.sql).
+        Returns {client_id: {'job_id', 'queue_position', 'created'}}.
+        """
+        if not client_ids:
+            return {}
+        result = await db.rpc('enqueue_jobs', {
+            'p_task_type': task_type,
+            'p_client_ids': client_ids,
+            'p_priority': priority
+        }).execute()
+
+        jobs = {row['client_id']: row for row in result.data or []}
+        if any(job['created'] for job in jobs.values()):
+            self._wakeups[task_type].set()
+        return jobs
+
+    async def claim(
+        self,
+        task_type: str,
+        limit: int,
+        lease_seconds: int = JOB_LEASE_SECONDS
+    ) -> List[Dict[str, Any]]:
+        """Lease up to `limit` available jobs of one type"""
+        result = await db.rpc('claim_jobs', {
+            'p_task_type': task_type,
+            'p_limit': limit,
+            'p_lease_seconds': lease_seconds,
+            'p_owner': self.owner
+        }).execute()
+        return result.data or []
+
+    async def wait_and_claim(
+        self,
+        task_type: str,
+        limit: int,
+        lease_seconds: int = JOB_LEASE_SECONDS
+    ) -> List[Dict[str, Any]]:
+        """Block until at least one job of this type is leased"""
+        wakeup = self._wakeups[task_type]
+        while True:
+            wakeup.clear()
+            jobs = await self.claim(task_type, limit, lease_seconds)
+            if jobs:
+                return jobs
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=JOB_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+
+    async def renew(self, job_ids: List[int], lease_seconds: int = JOB_LEASE_SECONDS) -> int:
+        """Extend the lease of jobs this process still holds; returns how many were renewed"""
+        if not job_ids:
+            return 0
+        result = await db.rpc('renew_jobs', {
+            'p_ids': job_ids,
+            'p_owner': self.owner,
+            'p_lease_seconds': lease_seconds
+        }).execute()
+        return len(result.data or [])
+
+    @asynccontextmanager
+    async def keep_leased(
+        self,
+        job_ids: List[int],
+        lease_seconds: int = JOB_LEASE_SECONDS
+    ) -> AsyncIterator[None]:
+        """Renew the jobs' lease every third of it until the block exits"""
+        async def heartbeat():
+            while True:
+                await asyncio.sleep(lease_seconds / 3)
+                try:
+                    renewed = await self.renew(job_ids, lease_seconds)
+                    if renewed < len(job_ids):
+                        logger.warning(f"⏳ Lost lease on {len(job_ids) - renewed} of {len(job_ids)} jobs")
+                except Exception as e:
+                    logger.warning(f"Job lease renewal error: {e}")
+
+        task = asyncio.create_task(heartbeat())
+        try:
+            yield
+        finally:
+            task.cancel()
+
+    async def ack(self, job_ids: List[int]):
+        """Job finished - remove it"""
+        if job_ids:
+            await db.table('job_queue').delete().in_('id', job_ids).execute()
+
+    async def nack(self, job_ids: List[int], error: str, delay: int = JOB_RETRY_DELAY):
+        """Job failed - retry after `delay` seconds, or fail it when out of attempts"""
+        if job_ids:
+            await db.rpc('release_jobs', {
+                'p_ids': job_ids,
+                'p_error': error[:500],
+                'p_delay_seconds': delay
+            }).execute()
+
+    async def defer(self, job_ids: List[int], delay: int):
+        """Put leased jobs back for later without using up an attempt"""
+        if job_ids:
+            await db.rpc('defer_jobs', {
+                'p_ids': job_ids,
+                'p_delay_seconds': delay
+            }).execute()
+
+    async def active_for_user(self, user_id: int) -> List[Dict[str, Any]]:
+        """Pending and leased jobs of one user (client_id, task_type, status)"""
+        result = await db.table('job_queue').select('client_id, task_type, status').eq(
+            'user_id', user_id
+        ).in_('status', ['pending', 'leased']).execute()
+        return result.data or []
+
+    async def sizes(self) -> Dict[str, Dict[str, int]]:
+        """{task_type: {status: count}}, cached for SIZES_TTL seconds"""
+        if time.monotonic() - self._sizes_at > self.SIZES_TTL:
+            try:
+                result = await db.rpc('job_queue_sizes', {}).execute()
+                sizes: Dict[str, Dict[str, int]] = defaultdict(dict)
+                for row in result.data or []:
+                    sizes[row['task_type']][row['status']] = row['jobs']
+                self._sizes = dict(sizes)
+                self._sizes_at = time.monotonic()
+            except Exception as e:
+                logger.warning(f"Job queue sizes error: {e}")
+        return self._sizes
+
+
+# Global instance
+job_queue = JobQueue()
@@ -1,10 +1,13 @@
 import os
 import re
+import json
 import asyncio
+import hashlib
+import secrets
 from datetime import datetime, timedelta
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from fastapi import FastAPI, Depends, HTTPException, status, Request, Form, File, UploadFile
-from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse
+from fastapi.responses import HTMLResponse, RedirectResponse, JSONResponse, StreamingResponse, Response
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from fastapi.staticfiles import StaticFiles
 from jose import JWTError, jwt
@@ -13,11 +16,14 @@ from slowapi import Limiter, _rate_limit_exceeded_handler
 from slowapi.util import get_remote_address
 from slowapi.errors import RateLimitExceeded
 import csv
-import io
-import httpx
 
-from database import supabase, init_db
+from database import init_db
+from db import db
+from cache import TTLCache
+from http_client import http_pool
+from image_cache import image_cache
 from scheduler import scheduler
+from job_queue import PRIORITY_INTERACTIVE, PRIORITY_BACKFILL
 
 # ============================================
 # Configuration & Security
@@ -34,6 +40,23 @@ MAX_ACCOUNTS_BRONZE = int(os.getenv("MAX_ACCOUNTS_BRONZE", 15))
 MAX_ACCOUNTS_SILVER = int(os.getenv("MAX_ACCOUNTS_SILVER", 50))
 MAX_ACCOUNTS_GOLD = int(os.getenv("MAX_ACCOUNTS_GOLD", 100))
 
+# Authenticated user cache (token subject -> user row)
+USER_CACHE_TTL = int(os.getenv("USER_CACHE_TTL", 300))  # seconds
+USER_COLUMNS = 'id, username'  # everything routes read from `user`
+user_cache = TTLCache(ttl=USER_CACHE_TTL)
+
+# Client columns sent to the dashboard table and /targets (never select '*')
+TARGET_COLUMNS = (
+    'id, username, custom_label, notes, lead_status, last_post_date, days_inactive, '
+    'followers_count, avg_posting_interval, status_signal, last_check_status, '
+    'last_error_message, post_url, facebook_page_url, ads_status, ads_count, created_at'
+)
+DASHBOARD_COLUMNS = TARGET_COLUMNS + ', profile_pic_url'
+
+EVENTS_KEEPALIVE = 15  # seconds between SSE keep-alive comments
+EVENTS_TICKET_TTL = 30  # seconds a GET /events ticket stays valid
+event_tickets = TTLCache(ttl=EVENTS_TICKET_TTL)  # ticket -> user ID, single use
+
 # Initialize database
 init_db()
 
@@ -102,11 +125,19 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except JWTError:
         raise credentials_exception
 
-    # Query user from Supabase
-    result = supabase.table('users').select('*').eq('username', username).execute()
-    if not result.data:
-        raise credentials_exception
-    return result.data[0]
+    # Cached per token subject - saves a Supabase round-trip per request
+    user = user_cache.get(username)
+    if user is None:
+        user = await db.get_user(username, columns=USER_COLUMNS)
+        if not user:
+            raise credentials_exception
+        user_cache.set(username, user)
+    return user
+
+
+def invalidate_user(username: str):
+    """Drop a cached user - call after register, password change or delete"""
+    user_cache.invalidate(username)
 
 
 # ============================================
@@ -114,11 +145,20 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
 # ============================================
 @app.on_event("startup")
 async def startup_event():
-    """Start the scheduler when app starts"""
+    """Start the shared HTTP pool and the scheduler when app starts"""
+    http_pool.start()
     await scheduler.start()
     print("Scheduler started successfully!")
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Close pooled connections when app stops"""
+    await image_cache.close()
+    await http_pool.close()
+    await db.close()
+
+
 # ============================================
 # Authentication Endpoints
 # ============================================
@@ -129,8 +169,7 @@ async def login_for_access_token(
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
     # Query user from Supabase
-    result = supabase.table('users').select('*').eq('username', form_data.username).execute()
-    user = result.data[0] if result.data else None
+    user = await db.get_user(form_data.username)
 
     if not user or not verify_password(form_data.password, user['hashed_password']):
         raise HTTPException(
@@ -151,8 +190,7 @@ async def register(
     password: str = Form(...)
 ):
     # Check if user exists
-    result = supabase.table('users').select('*').eq('username', username).execute()
-    if result.data:
+    if await db.get_user(username, columns='id'):
         raise HTTPException(status_code=400, detail="Username already registered")
 
     # Create new user
@@ -162,7 +200,8 @@ async def register(
         "hashed_password": hashed_password,
         "created_at": datetime.utcnow().isoformat()
     }
-    supabase.table('users').insert(new_user).execute()
+    await db.table('users').insert(new_user).execute()
+    invalidate_user(username)
 
     return {"status": "success", "message": "User registered successfully"}
 
@@ -204,30 +243,32 @@ async def client_page():
 # ============================================
 @app.get("/proxy/image")
 async def proxy_image(url: str):
-    """Proxy Instagram images to bypass CORS restrictions"""
+    """
+    Proxy Instagram images to bypass CORS restrictions.
+    Served from the server-side image cache when possible; misses are
+    streamed from upstream and concurrent requests share one fetch.
+    """
+    headers = {
+        "Cache-Control": "public, max-age=86400",  # Cache for 24 hours
+        "Access-Control-Allow-Origin": "*"
+    }
     try:
-        async with httpx.AsyncClient(timeout=30.0) as client:
-            response = await client.get(
-                url,
-                headers={
-                    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
-                    "Referer": "https://www.instagram.com/"
-                }
-            )
-            response.raise_for_status()
-
-            # Return image with proper headers
-            return StreamingResponse(
-                io.BytesIO(response.content),
-                media_type=response.headers.get("content-type", "image/jpeg"),
-                headers={
-                    "Cache-Control": "public, max-age=86400",  # Cache for 24 hours
-                    "Access-Control-Allow-Origin": "*"
-                }
-            )
+        content_type, body = await image_cache.fetch(
+            url,
+            http_pool.client,
+            headers={
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
+                "Referer": "https://www.instagram.com/"
+            }
+        )
     except Exception as e:
         raise HTTPException(status_code=404, detail=f"Failed to fetch image: {str(e)}")
 
+    # Return image with proper headers
+    if isinstance(body, bytes):
+        return Response(content=body, media_type=content_type, headers=headers)
+    return StreamingResponse(body, media_type=content_type, headers=headers)
+
 
 # ============================================
 # API Endpoints for Dashboard
@@ -242,57 +283,83 @@ async def get_current_user_info(user: dict = Depends(get_current_user)):
 
 
 @app.get("/data/dashboard")
-async def get_dashboard_data(user: dict = Depends(get_current_user)):
-    """Get dashboard data including stats and clients list"""
-    # Get all clients for this user from Supabase
-    result = supabase.table('clients').select('*').eq('user_id', user['id']).eq('is_tracked', True).execute()
-    clients = result.data
-
-    # Calculate stats
-    total_tracked = len(clients)
-    green_count = sum(1 for c in clients if c.get('status_signal') == "GREEN")
-    yellow_count = sum(1 for c in clients if c.get('status_signal') == "YELLOW")
-    red_count = sum(1 for c in clients if c.get('status_signal') == "RED")
-
-    # Queue status
-    queue_info = scheduler.get_queue_status()
-
-    # Prepare clients list
-    clients_list = [
-        {
-            "id": c['id'],
-            "username": c['username'],
-            "custom_label": c.get('custom_label'),
-            "notes": c.get('notes'),
-            "lead_status": c.get('lead_status'),
-            "last_post_date": c.get('last_post_date'),
-            "days_inactive": c.get('days_inactive'),
-            "followers_count": c.get('followers_count'),
-            "avg_posting_interval": c.get('avg_posting_interval'),
-            "status_signal": c.get('status_signal'),
-            "last_check_status": c.get('last_check_status'),
-            "last_error_message": c.get('last_error_message'),
-            "post_url": c.get('post_url'),
-            "facebook_page_url": c.get('facebook_page_url'),
-            "ads_status": c.get('ads_status'),
-            "ads_count": c.get('ads_count'),
-            "profile_pic_url": c.get('profile_pic_url'),
-            "created_at": c.get('created_at')
-        }
-        for c in clients
-    ]
-
-    return {
-        "stats": {
-            "total_tracked": total_tracked,
-            "green": green_count,
-            "yellow": yellow_count,
-            "red": red_count,
-            "queue_size": queue_info.get("instagram_queue", 0),
-            "ads_queue_size": queue_info.get("ads_queue", 0)
-        },
-        "clients_list": clients_list
+async def get_dashboard_data(
+    request: Request,
+    since: Optional[str] = None,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Get dashboard data including stats and clients list.
+    - ETag / If-None-Match: 304 when nothing changed since the client's copy.
+    - ?since=<version>: delta mode - only clients updated since that
+      version, plus the IDs of all tracked clients (to drop removed ones).
+    """
+    if since is not None:
+        try:
+            datetime.fromisoformat(since)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid 'since' version")
+
+    # Stats come from one grouped query that also returns the user's
+    # updated_at watermark; the queue status and the user's active jobs
+    # (queued / processing live in job_queue, not in clients) run alongside
+    stats, queue_info, job_states = await asyncio.gather(
+        db.get_client_stats(user['id']),
+        scheduler.get_queue_status(),
+        scheduler.get_job_states(user['id'])
+    )
+    user_stats = {
+        "total_tracked": stats['total_tracked'],
+        "green": stats['green'],
+        "yellow": stats['yellow'],
+        "red": stats['red']
     }
+    version = stats.get('last_updated')
+    queue_size = queue_info.get("instagram_queue", 0)
+    ads_queue_size = queue_info.get("ads_queue", 0)
+
+    # The ETag identifies this user's dashboard state, whichever mode is
+    # asked for. The queue sizes are global (every tenant's jobs), so they
+    # stay out of it and travel in headers, on 304s too.
+    etag = 'W/"' + hashlib.sha1(
+        json.dumps([user_stats, version, job_states], sort_keys=True).encode()
+    ).hexdigest() + '"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": "private, no-cache",
+        "X-Queue-Size": str(queue_size),
+        "X-Ads-Queue-Size": str(ads_queue_size)
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+
+    stats_payload = {**user_stats, "queue_size": queue_size, "ads_queue_size": ads_queue_size}
+    payload = {"stats": stats_payload, "version": version}
+    if since is None:
+        # The list only carries the columns the dashboard shows
+        payload["clients_list"] = scheduler.apply_job_states(
+            await db.list_tracked_clients(columns=DASHBOARD_COLUMNS, user_id=user['id']),
+            job_states
+        )
+    else:
+        changed, tracked = await asyncio.gather(
+            db.list_tracked_clients(columns=DASHBOARD_COLUMNS, user_id=user['id'], updated_since=since),
+            db.list_tracked_clients(columns='id', user_id=user['id'])
+        )
+        # Rows with an active job changed state without touching updated_at
+        tracked_ids = [c['id'] for c in tracked]
+        changed_ids = {c['id'] for c in changed}
+        active_ids = [cid for cid in tracked_ids if cid in job_states and cid not in changed_ids]
+        if active_ids:
+            changed += await db.get_clients(active_ids, columns=DASHBOARD_COLUMNS)
+        payload["delta"] = True
+        payload["clients_list"] = scheduler.apply_job_states(changed, job_states)
+        payload["client_ids"] = tracked_ids
+        # Every client with an active job - the dashboard reloads rows it
+        # still shows as queued / processing that are no longer in here
+        payload["active_jobs"] = {str(cid): states for cid, states in job_states.items()}
+
+    return JSONResponse(payload, headers=headers)
 
 
 # ============================================
@@ -311,14 +378,13 @@ async def add_target(
         raise HTTPException(status_code=400, detail="Invalid Instagram username format")
 
     # Check account limit
-    count_result = supabase.table('clients').select('id', count='exact').eq('user_id', user['id']).execute()
+    count_result = await db.table('clients').select('id', count='exact').eq('user_id', user['id']).execute()
     user_client_count = count_result.count if hasattr(count_result, 'count') else len(count_result.data)
     if user_client_count >= MAX_ACCOUNTS_BRONZE:
         raise HTTPException(status_code=400, detail=f"Account limit reached ({MAX_ACCOUNTS_BRONZE})")
 
     # Check if exists FOR THIS USER
-    existing_result = supabase.table('clients').select('*').eq('username', username).eq('user_id', user['id']).execute()
-    if existing_result.data:
+    if await db.get_client_by_username(username, user['id'], columns='id'):
         return {"status": "error", "message": "You are already tracking this account"}
 
     # Create new client
@@ -329,15 +395,15 @@ async def add_target(
         "tracking_started_at": datetime.utcnow().isoformat(),
         "created_at": datetime.utcnow().isoformat()
     }
-    insert_result = supabase.table('clients').insert(new_client).execute()
+    insert_result = await db.table('clients').insert(new_client).execute()
     new_client_id = insert_result.data[0]['id']
 
     # Add to queue using ID (not username)
     await scheduler.add_instagram_task(new_client_id)
 
     # Auto-trigger analytics and stories for immediate data
-    await scheduler.stories_queue.put(new_client_id)
-    asyncio.create_task(scheduler.process_analytics_job(new_client_id))
+    await scheduler.add_stories_tasks([new_client_id], priority=PRIORITY_INTERACTIVE)
+    await scheduler.add_analytics_task(new_client_id)
 
     return {"status": "success", "message": f"@{username} added to tracking queue"}
 
@@ -361,37 +427,55 @@ async def bulk_add_targets(
     added = []
     errors = []
 
+    # Clean and validate usernames
+    valid_usernames = []
     for username in usernames:
         username = username.strip().lower().lstrip('@')
 
         if not validate_instagram_username(username):
             errors.append(f"{username}: Invalid format")
             continue
-
-        # Check if already exists
-        existing_result = supabase.table('clients').select('*').eq('username', username).eq('user_id', user['id']).execute()
-        if existing_result.data:
-            errors.append(f"{username}: Already tracked")
+        if username in valid_usernames:
+            errors.append(f"{username}: Duplicate in list")
             continue
+        valid_usernames.append(username)
+
+    # Check which are already tracked - one query for the whole batch
+    if valid_usernames:
+        existing_result = await db.table('clients').select('username').eq(
+            'user_id', user['id']
+        ).in_('username', valid_usernames).execute()
+        existing = {row['username'] for row in existing_result.data or []}
+
+        for username in valid_usernames:
+            if username in existing:
+                errors.append(f"{username}: Already tracked")
+            else:
+                added.append(username)
+
+    # Add new clients - one multi-row insert
+    if added:
+        now = datetime.utcnow().isoformat()
+        insert_result = await db.table('clients').insert([
+            {
+                "username": username,
+                "user_id": user['id'],
+                "is_tracked": True,
+                "tracking_started_at": now,
+                "created_at": now
+            }
+            for username in added
+        ]).execute()
+        new_client_ids = [row['id'] for row in insert_result.data]
+
+        await scheduler.add_instagram_tasks(
+            new_client_ids,
+            priority=PRIORITY_INTERACTIVE
+        )
 
-        # Add new client
-        new_client = {
-            "username": username,
-            "user_id": user['id'],
-            "is_tracked": True,
-            "tracking_started_at": datetime.utcnow().isoformat(),
-            "created_at": datetime.utcnow().isoformat()
-        }
-        insert_result = supabase.table('clients').insert(new_client).execute()
-        new_client_id = insert_result.data[0]['id']
-
-        await scheduler.add_instagram_task(new_client_id)
-
-        # Auto-trigger analytics and stories
-        await scheduler.stories_queue.put(new_client_id)
-        asyncio.create_task(scheduler.process_analytics_job(new_client_id))
-
-        added.append(username)
+        # Auto-trigger analytics and stories through the worker queues
+        await scheduler.add_stories_tasks(new_client_ids, priority=PRIORITY_BACKFILL)
+        await scheduler.add_analytics_tasks(new_client_ids, priority=PRIORITY_BACKFILL)
 
     return {
         "status": "success",
@@ -404,31 +488,11 @@ async def bulk_add_targets(
 @app.get("/targets")
 async def get_targets(user: dict = Depends(get_current_user)):
     """Get all tracked accounts for current user"""
-    result = supabase.table('clients').select('*').eq('user_id', user['id']).eq('is_tracked', True).execute()
-    clients = result.data
-
-    return [
-        {
-            "id": c['id'],
-            "username": c['username'],
-            "custom_label": c.get('custom_label'),
-            "notes": c.get('notes'),
-            "lead_status": c.get('lead_status'),
-            "last_post_date": c.get('last_post_date'),
-            "days_inactive": c.get('days_inactive'),
-            "followers_count": c.get('followers_count'),
-            "avg_posting_interval": c.get('avg_posting_interval'),
-            "status_signal": c.get('status_signal'),
-            "last_check_status": c.get('last_check_status'),
-            "last_error_message": c.get('last_error_message'),
-            "post_url": c.get('post_url'),
-            "facebook_page_url": c.get('facebook_page_url'),
-            "ads_status": c.get('ads_status'),
-            "ads_count": c.get('ads_count'),
-            "created_at": c.get('created_at')
-        }
-        for c in clients
-    ]
+    clients, job_states = await asyncio.gather(
+        db.list_tracked_clients(columns=TARGET_COLUMNS, user_id=user['id']),
+        scheduler.get_job_states(user['id'])
+    )
+    return scheduler.apply_job_states(clients, job_states)
 
 
 @app.delete("/remove_target/{client_id}")
@@ -439,12 +503,10 @@ async def remove_target(
     user: dict = Depends(get_current_user)
 ):
     """Remove a tracked account"""
-    result = supabase.table('clients').select('*').eq('id', client_id).eq('user_id', user['id']).execute()
-
-    if not result.data:
+    if not await db.get_client(client_id, columns='id', user_id=user['id']):
         raise HTTPException(status_code=404, detail="Account not found")
 
-    supabase.table('clients').delete().eq('id', client_id).execute()
+    await db.table('clients').delete().eq('id', client_id).execute()
 
     return {"status": "success", "message": "Account removed"}
 
@@ -457,14 +519,18 @@ async def refresh_target(
     user: dict = Depends(get_current_user)
 ):
     """Manually refresh a single account"""
-    result = supabase.table('clients').select('*').eq('id', client_id).eq('user_id', user['id']).execute()
-
-    if not result.data:
+    if not await db.get_client(client_id, columns='id', user_id=user['id']):
         raise HTTPException(status_code=404, detail="Account not found")
 
-    await scheduler.add_instagram_task(client_id)
+    job = await scheduler.add_instagram_task(client_id)
+    if not job:
+        return {"status": "error", "message": "Could not queue refresh"}
 
-    return {"status": "success", "message": "Refresh queued"}
+    return {
+        "status": "success",
+        "message": "Refresh queued" if job['created'] else "Refresh already queued",
+        "queue_position": job['queue_position']
+    }
 
 
 @app.post("/update_client_metadata/{client_id}")
@@ -479,9 +545,7 @@ async def update_client_metadata(
     user: dict = Depends(get_current_user)
 ):
     """Update client metadata (label, notes, CRM status, etc.)"""
-    result = supabase.table('clients').select('*').eq('id', client_id).eq('user_id', user['id']).execute()
-
-    if not result.data:
+    if not await db.get_client(client_id, columns='id', user_id=user['id']):
         raise HTTPException(status_code=404, detail="Account not found")
 
     # Build update dict
@@ -496,7 +560,7 @@ async def update_client_metadata(
         update_data['facebook_page_url'] = facebook_page_url
 
     if update_data:
-        supabase.table('clients').update(update_data).eq('id', client_id).execute()
+        await db.update_client(client_id, update_data)
 
     return {"status": "success", "message": "Metadata updated"}
 
@@ -510,20 +574,22 @@ async def link_facebook(
     user: dict = Depends(get_current_user)
 ):
     """Link Facebook page to Instagram account and auto-check ads"""
-    result = supabase.table('clients').select('*').eq('username', username).eq('user_id', user['id']).execute()
+    client = await db.get_client_by_username(username, user['id'], columns='id')
 
-    if not result.data:
+    if not client:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    client = result.data[0]
-
     # Update Facebook URL
-    supabase.table('clients').update({'facebook_page_url': fb_url}).eq('id', client['id']).execute()
+    await db.update_client(client['id'], {'facebook_page_url': fb_url})
 
     # Automatically add to ads check queue
-    await scheduler.add_ads_task(client['id'])
+    job = await scheduler.add_ads_task(client['id'])
 
-    return {"status": "success", "message": "Facebook page linked and ads check queued"}
+    return {
+        "status": "success",
+        "message": "Facebook page linked and ads check queued",
+        "queue_position": job['queue_position'] if job else None
+    }
 
 
 @app.post("/check_facebook_ads/{client_id}")
@@ -534,24 +600,82 @@ async def check_facebook_ads(
     user: dict = Depends(get_current_user)
 ):
     """Check Facebook Ads for a client"""
-    result = supabase.table('clients').select('*').eq('id', client_id).eq('user_id', user['id']).execute()
+    client = await db.get_client(client_id, columns='id, facebook_page_url', user_id=user['id'])
 
-    if not result.data:
+    if not client:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    client = result.data[0]
     if not client.get('facebook_page_url'):
         raise HTTPException(status_code=400, detail="No Facebook page URL set")
 
-    await scheduler.add_ads_task(client_id)
+    job = await scheduler.add_ads_task(client_id)
+    if not job:
+        return {"status": "error", "message": "Could not queue ads check"}
 
-    return {"status": "success", "message": "Ads check queued"}
+    return {
+        "status": "success",
+        "message": "Ads check queued" if job['created'] else "Ads check already queued",
+        "queue_position": job['queue_position']
+    }
+
+
+@app.post("/events/ticket")
+@limiter.limit("30/minute")
+async def create_events_ticket(request: Request, user: dict = Depends(get_current_user)):
+    """
+    Short-lived, single-use ticket for opening GET /events. EventSource
+    cannot send headers, and the bearer token must not end up in URLs
+    (access logs, browser history).
+    """
+    ticket = secrets.token_urlsafe(32)
+    event_tickets.set(ticket, user['id'])
+    return {"ticket": ticket, "expires_in": EVENTS_TICKET_TTL}
+
+
+@app.get("/events")
+async def stream_events(request: Request, ticket: str):
+    """
+    Server-Sent Events stream of the user's job progress (queued,
+    processing, success, failed, deferred) with the client fields that
+    changed. Opened with a ticket from POST /events/ticket.
+    """
+    user_id = event_tickets.get(ticket)
+    event_tickets.invalidate(ticket)
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid or expired ticket")
+
+    async def event_stream():
+        queue = scheduler.events.subscribe(user_id)
+        try:
+            yield "retry: 5000\n\n"
+            while not await request.is_disconnected():
+                try:
+                    event = await asyncio.wait_for(queue.get(), timeout=EVENTS_KEEPALIVE)
+                    yield f"data: {json.dumps(event)}\n\n"
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            scheduler.events.unsubscribe(user_id, queue)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 
 @app.get("/queue_status")
 async def get_queue_status(user: dict = Depends(get_current_user)):
     """Get current queue status for monitoring"""
-    return scheduler.get_queue_status()
+    return {
+        **(await scheduler.get_queue_status()),
+        "apify_rates": scheduler.scraper.rate_metrics(),
+        "apify_retries": scheduler.scraper.retry.metrics(),
+        "apify_breakers": scheduler.scraper.breaker_metrics(),
+        "events": scheduler.events.metrics(),
+        "http_pool": http_pool.metrics(),
+        "image_cache": image_cache.metrics()
+    }
 
 
 @app.put("/update_client_crm")
@@ -564,13 +688,11 @@ async def update_client_crm(
     data = await request.json()
     username = data.get("username")
 
-    result = supabase.table('clients').select('*').eq('username', username).eq('user_id', user['id']).execute()
+    client = await db.get_client_by_username(username, user['id'], columns='id')
 
-    if not result.data:
+    if not client:
         raise HTTPException(status_code=404, detail="Account not found")
 
-    client = result.data[0]
-
     # Build update dict
     update_data = {}
     if "custom_label" in data:
@@ -583,7 +705,7 @@ async def update_client_crm(
         update_data['facebook_page_url'] = data["facebook_page_url"]
 
     if update_data:
-        supabase.table('clients').update(update_data).eq('id', client['id']).execute()
+        await db.update_client(client['id'], update_data)
 
     return {"status": "success", "message": "Updated successfully"}
 
@@ -598,6 +720,98 @@ async def logout():
 # Analytics & Stories API Endpoints
 # ============================================
 
+CLIENT_PREVIEW_SIZE = 6  # posts / stories shown on the client page before "view more"
+
+
+async def fetch_media_page(table: str, client_id: int, page: int, limit: int) -> Tuple[List[dict], int]:
+    """One page of a client's posts or stories, newest first, plus the total (one query)"""
+    offset = (page - 1) * limit
+    result = await db.table(table).select('*', count='exact').eq(
+        'client_id', client_id
+    ).order('posted_at', desc=True).range(offset, offset + limit - 1).execute()
+    return result.data or [], result.count or 0
+
+
+def group_by_date(items: List[dict]) -> Dict[str, List[dict]]:
+    """{YYYY-MM-DD: [items]} by posted_at"""
+    grouped: Dict[str, List[dict]] = {}
+    for item in items:
+        if item.get('posted_at'):
+            grouped.setdefault(item['posted_at'][:10], []).append(item)
+    return grouped
+
+
+async def fetch_heatmap(client_id: int, year: int) -> List[dict]:
+    result = await db.table('activity_calendar').select('*').eq(
+        'client_id', client_id
+    ).gte('activity_date', f"{year}-01-01").lte('activity_date', f"{year}-12-31").execute()
+    return result.data or []
+
+
+async def fetch_analytics_history(client_id: int, days: int) -> List[dict]:
+    end_date = datetime.now().date()
+    start_date = end_date - timedelta(days=days)
+    result = await db.table('analytics_snapshots').select('*').eq(
+        'client_id', client_id
+    ).gte('snapshot_date', str(start_date)).lte('snapshot_date', str(end_date)).order(
+        'snapshot_date', desc=False
+    ).execute()
+    return result.data or []
+
+
+async def fetch_latest_analytics(client_id: int) -> Optional[dict]:
+    result = await db.table('analytics_snapshots').select('*').eq(
+        'client_id', client_id
+    ).order('snapshot_date', desc=True).limit(1).execute()
+    return result.data[0] if result.data else None
+
+
+@app.get("/api/client/{client_id}/overview")
+@limiter.limit("100/minute")
+async def get_client_overview(
+    request: Request,
+    client_id: int,
+    year: Optional[int] = None,
+    days: int = 30,
+    user: dict = Depends(get_current_user)
+):
+    """
+    Everything client.html needs for first paint in one response: client,
+    latest analytics, heatmap, analytics history and the posts / stories
+    previews with their totals. Ownership is checked once, then the
+    sub-queries run concurrently.
+    """
+    client = await db.get_client(client_id, user_id=user['id'])
+    if not client:
+        raise HTTPException(status_code=404, detail="Client not found")
+
+    year = year or datetime.now().year
+    activity_data, history, (posts, total_posts), (stories, total_stories) = await asyncio.gather(
+        fetch_heatmap(client_id, year),
+        fetch_analytics_history(client_id, days),
+        fetch_media_page('posts', client_id, 1, CLIENT_PREVIEW_SIZE),
+        fetch_media_page('stories', client_id, 1, CLIENT_PREVIEW_SIZE)
+    )
+    # The newest snapshot is usually the last one of the history
+    latest_analytics = history[-1] if history else await fetch_latest_analytics(client_id)
+
+    return {
+        "status": "success",
+        "client": client,
+        "analytics": latest_analytics,
+        "total_stories": total_stories,
+        "total_posts": total_posts,
+        "heatmap": {
+            "year": year,
+            "tracking_started_at": client.get('tracking_started_at'),
+            "activity_data": activity_data
+        },
+        "analytics_history": history,
+        "posts": posts,
+        "stories": stories
+    }
+
+
 @app.get("/api/client/{client_id}")
 @limiter.limit("100/minute")
 async def get_client_details(
@@ -607,23 +821,17 @@ async def get_client_details(
 ):
     """Get full client details with analytics"""
     # Fetch client
-    result = supabase.table('clients').select('*').eq('id', client_id).eq('user_id', user['id']).execute()
+    client = await db.get_client(client_id, user_id=user['id'])
 
-    if not result.data:
+    if not client:
         raise HTTPException(status_code=404, detail="Client not found")
 
-    client = result.data[0]
-
-    # Get latest analytics snapshot
-    analytics_result = supabase.table('analytics_snapshots').select('*').eq(
-        'client_id', client_id
-    ).order('snapshot_date', desc=True).limit(1).execute()
-
-    latest_analytics = analytics_result.data[0] if analytics_result.data else None
-
-    # Get total stories and posts count
-    stories_count_result = supabase.table('stories').select('id', count='exact').eq('client_id', client_id).execute()
-    posts_count_result = supabase.table('posts').select('id', count='exact').eq('client_id', client_id).execute()
+    # Latest analytics snapshot and the stories / posts counts, concurrently
+    latest_analytics, stories_count_result, posts_count_result = await asyncio.gather(
+        fetch_latest_analytics(client_id),
+        db.table('stories').select('id', count='exact').eq('client_id', client_id).limit(1).execute(),
+        db.table('posts').select('id', count='exact').eq('client_id', client_id).limit(1).execute()
+    )
 
     stories_count = stories_count_result.count if stories_count_result.count else 0
     posts_count = posts_count_result.count if posts_count_result.count else 0
@@ -647,29 +855,16 @@ async def get_client_heatmap(
 ):
     """Get activity heatmap data for a client"""
     # Verify ownership
-    result = supabase.table('clients').select('id', 'tracking_started_at').eq(
-        'id', client_id
-    ).eq('user_id', user['id']).execute()
+    client = await db.get_client(client_id, columns='id, tracking_started_at', user_id=user['id'])
 
-    if not result.data:
+    if not client:
         raise HTTPException(status_code=404, detail="Client not found")
 
-    client = result.data[0]
-    tracking_started = client.get('tracking_started_at')
-
-    # Fetch activity calendar for the year
-    start_date = f"{year}-01-01"
-    end_date = f"{year}-12-31"
-
-    activity_result = supabase.table('activity_calendar').select('*').eq(
-        'client_id', client_id
-    ).gte('activity_date', start_date).lte('activity_date', end_date).execute()
-
     return {
         "status": "success",
         "year": year,
-        "tracking_started_at": tracking_started,
-        "activity_data": activity_result.data
+        "tracking_started_at": client.get('tracking_started_at'),
+        "activity_data": await fetch_heatmap(client_id, year)
     }
 
 
@@ -683,9 +878,7 @@ async def get_client_activity_by_date(
 ):
     """Get stories and posts for a specific date"""
     # Verify ownership
-    result = supabase.table('clients').select('id').eq('id', client_id).eq('user_id', user['id']).execute()
-
-    if not result.data:
+    if not await db.get_client(client_id, columns='id', user_id=user['id']):
         raise HTTPException(status_code=404, detail="Client not found")
 
     # Parse date
@@ -696,12 +889,12 @@ async def get_client_activity_by_date(
         raise HTTPException(status_code=400, detail="Invalid date format")
 
     # Fetch stories for that date
-    stories_result = supabase.table('stories').select('*').eq(
+    stories_result = await db.table('stories').select('*').eq(
         'client_id', client_id
     ).gte('posted_at', str(target_date)).lt('posted_at', str(next_day)).execute()
 
     # Fetch posts for that date
-    posts_result = supabase.table('posts').select('*').eq(
+    posts_result = await db.table('posts').select('*').eq(
         'client_id', client_id
     ).gte('posted_at', str(target_date)).lt('posted_at', str(next_day)).execute()
 
@@ -723,26 +916,13 @@ async def get_client_analytics_history(
 ):
     """Get analytics history for trending charts"""
     # Verify ownership
-    result = supabase.table('clients').select('id').eq('id', client_id).eq('user_id', user['id']).execute()
-
-    if not result.data:
+    if not await db.get_client(client_id, columns='id', user_id=user['id']):
         raise HTTPException(status_code=404, detail="Client not found")
 
-    # Calculate date range
-    end_date = datetime.now().date()
-    start_date = end_date - timedelta(days=days)
-
-    # Fetch analytics snapshots
-    analytics_result = supabase.table('analytics_snapshots').select('*').eq(
-        'client_id', client_id
-    ).gte('snapshot_date', str(start_date)).lte('snapshot_date', str(end_date)).order(
-        'snapshot_date', desc=False
-    ).execute()
-
     return {
         "status": "success",
         "days": days,
-        "analytics": analytics_result.data
+        "analytics": await fetch_analytics_history(client_id, days)
     }
 
 
@@ -757,39 +937,19 @@ async def get_client_posts(
 ):
     """Get paginated posts archive (grouped by date)"""
     # Verify ownership
-    result = supabase.table('clients').select('id').eq('id', client_id).eq('user_id', user['id']).execute()
-
-    if not result.data:
+    if not await db.get_client(client_id, columns='id', user_id=user['id']):
         raise HTTPException(status_code=404, detail="Client not found")
 
-    # Calculate offset
-    offset = (page - 1) * limit
-
-    # Fetch posts with pagination
-    posts_result = supabase.table('posts').select('*').eq(
-        'client_id', client_id
-    ).order('posted_at', desc=True).range(offset, offset + limit - 1).execute()
-
-    # Get total count
-    count_result = supabase.table('posts').select('id', count='exact').eq('client_id', client_id).execute()
-    total_count = count_result.count if count_result.count else 0
-
-    # Group posts by date
-    posts_by_date = {}
-    for post in posts_result.data:
-        if post.get('posted_at'):
-            post_date = post['posted_at'][:10]  # YYYY-MM-DD
-            if post_date not in posts_by_date:
-                posts_by_date[post_date] = []
-            posts_by_date[post_date].append(post)
+    # Page and total count in one query
+    posts, total_count = await fetch_media_page('posts', client_id, page, limit)
 
     return {
         "status": "success",
         "page": page,
         "limit": limit,
         "total": total_count,
-        "posts_by_date": posts_by_date,
-        "posts": posts_result.data
+        "posts_by_date": group_by_date(posts),
+        "posts": posts
     }
 
 
@@ -804,39 +964,19 @@ async def get_client_stories(
 ):
     """Get paginated stories archive (grouped by date)"""
     # Verify ownership
-    result = supabase.table('clients').select('id').eq('id', client_id).eq('user_id', user['id']).execute()
-
-    if not result.data:
+    if not await db.get_client(client_id, columns='id', user_id=user['id']):
         raise HTTPException(status_code=404, detail="Client not found")
 
-    # Calculate offset
-    offset = (page - 1) * limit
-
-    # Fetch stories with pagination
-    stories_result = supabase.table('stories').select('*').eq(
-        'client_id', client_id
-    ).order('posted_at', desc=True).range(offset, offset + limit - 1).execute()
-
-    # Get total count
-    count_result = supabase.table('stories').select('id', count='exact').eq('client_id', client_id).execute()
-    total_count = count_result.count if count_result.count else 0
-
-    # Group stories by date
-    stories_by_date = {}
-    for story in stories_result.data:
-        if story.get('posted_at'):
-            story_date = story['posted_at'][:10]  # YYYY-MM-DD
-            if story_date not in stories_by_date:
-                stories_by_date[story_date] = []
-            stories_by_date[story_date].append(story)
+    # Page and total count in one query
+    stories, total_count = await fetch_media_page('stories', client_id, page, limit)
 
     return {
         "status": "success",
         "page": page,
         "limit": limit,
         "total": total_count,
-        "stories_by_date": stories_by_date,
-        "stories": stories_result.data
+        "stories_by_date": group_by_date(stories),
+        "stories": stories
     }
 
 
@@ -848,14 +988,14 @@ async def get_user_alerts(
     user: dict = Depends(get_current_user)
 ):
     """Get user alerts (inactivity notifications)"""
-    query = supabase.table('inactivity_alerts').select(
+    query = db.table('inactivity_alerts').select(
         '*, clients(username, profile_pic_url)'
     ).eq('user_id', user['id'])
 
     if unread_only:
         query = query.eq('is_read', False)
 
-    result = query.order('created_at', desc=True).limit(50).execute()
+    result = await query.order('created_at', desc=True).limit(50).execute()
 
     return {
         "status": "success",
@@ -872,7 +1012,7 @@ async def mark_alert_as_read(
 ):
     """Mark an alert as read"""
     # Verify ownership
-    result = supabase.table('inactivity_alerts').select('id').eq(
+    result = await db.table('inactivity_alerts').select('id').eq(
         'id', alert_id
     ).eq('user_id', user['id']).execute()
 
@@ -880,7 +1020,7 @@ async def mark_alert_as_read(
         raise HTTPException(status_code=404, detail="Alert not found")
 
     # Update alert
-    supabase.table('inactivity_alerts').update({'is_read': True}).eq('id', alert_id).execute()
+    await db.table('inactivity_alerts').update({'is_read': True}).eq('id', alert_id).execute()
 
     return {"status": "success", "message": "Alert marked as read"}
 
@@ -894,7 +1034,7 @@ async def dismiss_alert(
 ):
     """Dismiss an alert"""
     # Verify ownership
-    result = supabase.table('inactivity_alerts').select('id').eq(
+    result = await db.table('inactivity_alerts').select('id').eq(
         'id', alert_id
     ).eq('user_id', user['id']).execute()
 
@@ -902,7 +1042,7 @@ async def dismiss_alert(
         raise HTTPException(status_code=404, detail="Alert not found")
 
     # Update alert
-    supabase.table('inactivity_alerts').update({
+    await db.table('inactivity_alerts').update({
         'is_dismissed': True,
         'is_read': True
     }).eq('id', alert_id).execute()
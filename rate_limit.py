@@ -0,0 +1,85 @@
+import time
+import asyncio
+
+
+class TokenBucket:
+    """
+    Async token bucket: refills `rate` tokens per second up to `capacity`.
+    acquire() waits until a token is available.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveTokenBucket(TokenBucket):
+    """
+    Token bucket whose rate adapts to the upstream (AIMD):
+    - every success adds `increase` tokens/s, up to `max_rate`
+    - a failure (error, timeout) multiplies the rate by `decrease`, down to
+      `min_rate`, at most once per `cooldown` seconds so a burst of failures
+      from calls already in flight counts as one congestion signal
+    """
+
+    def __init__(
+        self,
+        rate: float,
+        min_rate: float,
+        max_rate: float,
+        increase: float = 0.02,
+        decrease: float = 0.5,
+        cooldown: float = 10,
+        capacity: float = 1
+    ):
+        super().__init__(rate, capacity)
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.successes = 0
+        self.failures = 0
+        self._decreased_at = 0.0
+
+    def _set_rate(self, rate: float):
+        # Bank tokens earned at the old rate before switching
+        self._refill()
+        self.rate = min(self.max_rate, max(self.min_rate, rate))
+
+    def on_success(self):
+        self.successes += 1
+        self._set_rate(self.rate + self.increase)
+
+    def on_failure(self):
+        self.failures += 1
+        now = time.monotonic()
+        if now - self._decreased_at >= self.cooldown:
+            self._decreased_at = now
+            self._set_rate(self.rate * self.decrease)
+
+    def metrics(self) -> dict:
+        return {
+            "rate_per_min": round(self.rate * 60, 2),
+            "min_rate_per_min": round(self.min_rate * 60, 2),
+            "max_rate_per_min": round(self.max_rate * 60, 2),
+            "successes": self.successes,
+            "failures": self.failures
+        }
@@ -0,0 +1,94 @@
+import random
+import asyncio
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class PermanentError(Exception):
+    """A failure that retrying cannot fix (bad input, missing actor, auth)"""
+
+
+class TransientError(Exception):
+    """A classified failure worth retrying; `reason` is what gets counted"""
+
+    reason = "error"
+
+
+class RetryPolicy:
+    """
+    Retries transient failures with exponential backoff and full jitter
+    (sleep a random 0..min(max_delay, base_delay * 2^attempt) seconds), so
+    workers that fail together do not retry together. Permanent failures
+    are raised at once. Retries and give-ups are counted per reason.
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 2, max_delay: float = 60):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retries: Counter = Counter()
+        self.gave_up: Counter = Counter()
+        self.permanent: Counter = Counter()
+
+    @staticmethod
+    def classify(error: BaseException) -> Tuple[str, bool]:
+        """(reason, transient) for an exception"""
+        if isinstance(error, PermanentError):
+            return getattr(error, "reason", "permanent"), False
+        if isinstance(error, TransientError):
+            return error.reason, True
+        if isinstance(error, asyncio.TimeoutError):
+            return "timeout", True
+
+        # ApifyApiError (and HTTP errors in general) carry the status code
+        status_code = getattr(error, "status_code", None)
+        if status_code is None:
+            status_code = getattr(getattr(error, "response", None), "status_code", None)
+        if status_code == 429:
+            return "rate_limited", True
+        if isinstance(status_code, int) and status_code >= 500:
+            return "server_error", True
+        if isinstance(status_code, int) and 400 <= status_code < 500:
+            return f"http_{status_code}", False
+
+        if isinstance(error, (ConnectionError, OSError)):
+            return "network", True
+        return "error", True  # unknown - assume transient
+
+    def backoff(self, attempt: int) -> float:
+        """Full jitter delay before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def call(self, func: Callable[[], Awaitable[Any]], label: str = "") -> Any:
+        """
+        Await func() until it succeeds, a permanent error occurs or
+        max_attempts is used up; the last error is re-raised.
+        """
+        for attempt in range(self.max_attempts):
+            try:
+                return await func()
+            except Exception as e:
+                reason, transient = self.classify(e)
+                if not transient:
+                    self.permanent[reason] += 1
+                    logger.warning(f"🚫 {label} permanent failure ({reason}): {e}")
+                    raise
+                if attempt == self.max_attempts - 1:
+                    self.gave_up[reason] += 1
+                    logger.error(f"❌ {label} failed after {self.max_attempts} attempts ({reason}): {e}")
+                    raise
+
+                self.retries[reason] += 1
+                delay = self.backoff(attempt)
+                logger.warning(f"🔁 {label} {reason}, retry {attempt + 1} in {delay:.1f}s")
+                await asyncio.sleep(delay)
+
+    def metrics(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "retries": dict(self.retries),
+            "gave_up": dict(self.gave_up),
+            "permanent": dict(self.permanent)
+        }
@@ -1,8 +1,16 @@
+import os
 import asyncio
 import logging
-from database import supabase
-from scraper import ApifyScraper
-from datetime import datetime, timedelta, date
+from db import db
+from scraper import ApifyScraper, INSTAGRAM_ACTOR, ADS_ACTOR, STORIES_ACTOR
+from circuit_breaker import CircuitOpenError
+from cache import scrape_cache
+from events import EventBus
+from job_queue import job_queue, PRIORITY_INTERACTIVE, PRIORITY_SCHEDULED, PRIORITY_BACKFILL
+from rate_limit import TokenBucket
+from typing import Dict, List, Optional
+from collections import Counter
+from datetime import datetime, timedelta, timezone, date
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 
 # Setup logging
@@ -12,10 +20,10 @@ logger = logging.getLogger(__name__)
 
 class ScrapeScheduler:
     def __init__(self):
-        # Separate queues for different task types
-        self.instagram_queue = asyncio.Queue(maxsize=1000)
-        self.ads_queue = asyncio.Queue(maxsize=1000)
-        self.stories_queue = asyncio.Queue(maxsize=1000)
+        # Durable job queue (job_queue table) - one task type per worker pool
+        self.jobs = job_queue
+        # Job progress pushed to connected dashboards (GET /events)
+        self.events = EventBus()
         self.scraper = ApifyScraper()
         self.is_running = False
         self.scheduler = AsyncIOScheduler()
@@ -24,9 +32,51 @@ class ScrapeScheduler:
         self.INSTAGRAM_WORKERS = 10
         self.ADS_WORKERS = 5
         self.STORIES_WORKERS = 3
-        self.INSTAGRAM_DELAY = 2  # seconds between requests per worker
-        self.ADS_DELAY = 3
-        self.STORIES_DELAY = 5
+        self.ANALYTICS_WORKERS = int(os.getenv("ANALYTICS_WORKERS", 2))
+        self.INSTAGRAM_BATCH_SIZE = 25  # usernames per Apify run
+        self.THUMBNAIL_CONCURRENCY = 5  # parallel thumbnail uploads per client
+
+        # Client fields shown while a job is queued / running - pushed as
+        # events instead of being written to the database
+        self.QUEUED_FIELDS = {'instagram': {'last_check_status': 'queued'}}
+        self.PROCESSING_FIELDS = {
+            'instagram': {'last_check_status': 'processing'},
+            'ads': {'ads_status': 'CHECKING...'}
+        }
+
+        # Apify actor each task type depends on (for its circuit breaker)
+        self.TASK_ACTORS = {
+            'instagram': INSTAGRAM_ACTOR,
+            'ads': ADS_ACTOR,
+            'stories': STORIES_ACTOR,
+            'analytics': INSTAGRAM_ACTOR
+        }
+
+        # Staleness-aware refresh - each client is due again after about half
+        # its posting interval, capped by how active its signal says it is
+        self.REFRESH_CHECK_MINUTES = int(os.getenv("REFRESH_CHECK_MINUTES", 60))  # how often to look for due clients
+        self.REFRESH_MIN_HOURS = float(os.getenv("REFRESH_MIN_HOURS", 6))
+        self.REFRESH_MAX_HOURS = {  # by status_signal
+            'RED': 12,      # active - posted recently
+            'YELLOW': 24,   # slowing down
+            'GREEN': 72     # dormant for 14+ days
+        }
+        # Failed checks (private, deleted, no posts) back off: REFRESH_MIN_HOURS
+        # doubled per consecutive failure, up to REFRESH_FAILED_MAX_HOURS
+        self.REFRESH_FAILED_MAX_HOURS = float(os.getenv("REFRESH_FAILED_MAX_HOURS", 168))
+
+        # Daily analytics run (3 AM) - parallel, rate limited, resumable
+        self.DAILY_ANALYTICS_CONCURRENCY = int(os.getenv("DAILY_ANALYTICS_CONCURRENCY", 5))
+        self.DAILY_ANALYTICS_RATE = float(os.getenv("DAILY_ANALYTICS_RATE", 0.5))  # job starts per second
+        self.DAILY_ANALYTICS_DEADLINE = float(os.getenv("DAILY_ANALYTICS_DEADLINE_HOURS", 20)) * 3600
+        self.DAILY_ANALYTICS_SAVE_EVERY = 10  # persist cursor every N jobs
+        self.daily_analytics_limiter = TokenBucket(rate=self.DAILY_ANALYTICS_RATE)
+        self.daily_analytics_progress: Dict = {}
+
+        # Task registry - strong references to worker tasks (never GC'd or
+        # silently lost) and the analytics jobs currently running
+        self.worker_tasks: List[asyncio.Task] = []
+        self.analytics_in_progress: Dict[int, datetime] = {}
 
     async def start(self):
         """Start all workers and scheduler"""
@@ -38,27 +88,40 @@ class ScrapeScheduler:
 
         # Start Instagram workers (10 parallel)
         for i in range(self.INSTAGRAM_WORKERS):
-            asyncio.create_task(self.instagram_worker(i))
+            self._spawn_worker(self.instagram_worker(i), f"instagram-{i}")
             logger.info(f"   ✅ Instagram Worker {i+1} started")
 
         # Start Ads workers (5 parallel)
         for i in range(self.ADS_WORKERS):
-            asyncio.create_task(self.ads_worker(i))
+            self._spawn_worker(self.ads_worker(i), f"ads-{i}")
             logger.info(f"   ✅ Ads Worker {i+1} started")
 
         # Start Stories workers (3 parallel)
         for i in range(self.STORIES_WORKERS):
-            asyncio.create_task(self.stories_worker(i))
+            self._spawn_worker(self.stories_worker(i), f"stories-{i}")
             logger.info(f"   ✅ Stories Worker {i+1} started")
 
-        # Schedule automatic refresh every 12 hours
+        # Start Analytics workers (ANALYTICS_WORKERS parallel)
+        for i in range(self.ANALYTICS_WORKERS):
+            self._spawn_worker(self.analytics_worker(i), f"analytics-{i}")
+            logger.info(f"   ✅ Analytics Worker {i+1} started")
+
+        # Look for clients due an Instagram refresh (staleness-aware)
         self.scheduler.add_job(
             self.refresh_all_targets,
             'interval',
-            hours=12,
+            minutes=self.REFRESH_CHECK_MINUTES,
             id='refresh_all'
         )
 
+        # Schedule ads refresh every 12 hours
+        self.scheduler.add_job(
+            self.refresh_all_ads,
+            'interval',
+            hours=12,
+            id='refresh_ads'
+        )
+
         # Schedule stories refresh every 20 hours
         self.scheduler.add_job(
             self.refresh_all_stories,
@@ -87,95 +150,116 @@ class ScrapeScheduler:
 
         self.scheduler.start()
 
-        logger.info("🚀 Scheduler fully started with 18 workers!")
+        # Finish a daily analytics run interrupted by a restart
+        self._spawn_worker(self._resume_daily_analytics(), "daily-analytics-resume")
+
+        total_workers = (
+            self.INSTAGRAM_WORKERS + self.ADS_WORKERS +
+            self.STORIES_WORKERS + self.ANALYTICS_WORKERS
+        )
+        logger.info(f"🚀 Scheduler fully started with {total_workers} workers!")
 
-    async def add_instagram_task(self, client_id: int):
+    def _spawn_worker(self, coro, name: str):
+        """Start a worker task and keep it in the registry"""
+        task = asyncio.create_task(coro, name=name)
+        self.worker_tasks.append(task)
+        task.add_done_callback(self._on_worker_done)
+
+    def _on_worker_done(self, task: asyncio.Task):
+        if task.cancelled():
+            return
+        if task.exception():
+            logger.error(f"Worker {task.get_name()} stopped: {task.exception()}")
+
+    async def _enqueue(
+        self,
+        task_type: str,
+        client_ids: List[int],
+        priority: int = PRIORITY_SCHEDULED
+    ) -> Dict[int, Dict]:
+        """
+        Queue jobs of one type in a priority lane. Clients that already have
+        a pending job of this type are coalesced - they keep their existing
+        job and position (moved up if this lane is more urgent).
+        """
+        jobs = await self.jobs.enqueue(task_type, client_ids, priority)
+        for client_id, job in jobs.items():
+            self.events.publish_job(
+                job.get('user_id'), client_id, task_type, 'queued',
+                {**self.QUEUED_FIELDS.get(task_type, {}), 'queue_position': job['queue_position']}
+            )
+        created = [cid for cid, job in jobs.items() if job['created']]
+        coalesced = [cid for cid, job in jobs.items() if not job['created']]
+        if created:
+            logger.info(f"📥 Queued {task_type} (lane {priority}): clients {created}")
+        if coalesced:
+            logger.info(f"🔁 Already queued {task_type}: clients {coalesced}")
+        return jobs
+
+    async def add_instagram_task(self, client_id: int, priority: int = PRIORITY_INTERACTIVE) -> Optional[Dict]:
         """
         Add Instagram scraping task by CLIENT ID (not username).
         This prevents collisions when multiple users track same account.
+        Returns the job (new or already pending) with its queue position.
         """
-        try:
-            # Fetch client from Supabase
-            result = supabase.table('clients').select('*').eq('id', client_id).execute()
-            if result.data and len(result.data) > 0:
-                # Update status to queued
-                supabase.table('clients').update(
-                    {'last_check_status': 'queued'}
-                ).eq('id', client_id).execute()
-
-                await self.instagram_queue.put(client_id)
-                logger.info(f"📥 Queued Instagram: client #{client_id}")
-        except Exception as e:
-            logger.error(f"Error queuing task: {e}")
+        return (await self.add_instagram_tasks([client_id], priority=priority)).get(client_id)
 
-    async def add_ads_task(self, client_id: int):
-        """Add Facebook Ads check task"""
-        await self.ads_queue.put(client_id)
-        logger.info(f"📥 Queued Ads check: client #{client_id}")
-
-    async def instagram_worker(self, worker_id: int):
-        """Worker that processes Instagram scraping tasks"""
-        while True:
-            try:
-                # Wait for task from queue
-                client_id = await self.instagram_queue.get()
-                logger.info(f"⚙️ Worker {worker_id}: client #{client_id}")
+    async def add_instagram_tasks(
+        self,
+        client_ids: List[int],
+        priority: int = PRIORITY_SCHEDULED
+    ) -> Dict[int, Dict]:
+        """
+        Add many Instagram scraping tasks. 'queued' lives in the job queue
+        (see get_job_states), not in clients.last_check_status.
+        """
+        return await self._enqueue('instagram', client_ids, priority)
 
-                try:
-                    # Fetch client from Supabase
-                    result = supabase.table('clients').select('*').eq('id', client_id).execute()
+    async def add_ads_task(self, client_id: int, priority: int = PRIORITY_INTERACTIVE) -> Optional[Dict]:
+        """Add Facebook Ads check task"""
+        return (await self.add_ads_tasks([client_id], priority)).get(client_id)
 
-                    if not result.data or len(result.data) == 0:
-                        logger.warning(f"Client {client_id} not found")
-                        self.instagram_queue.task_done()
-                        await asyncio.sleep(self.INSTAGRAM_DELAY)
-                        continue
+    async def add_ads_tasks(self, client_ids: List[int], priority: int = PRIORITY_SCHEDULED) -> Dict[int, Dict]:
+        """Add Facebook Ads check tasks"""
+        return await self._enqueue('ads', client_ids, priority)
 
-                    client = result.data[0]
+    async def add_stories_tasks(self, client_ids: List[int], priority: int = PRIORITY_SCHEDULED) -> Dict[int, Dict]:
+        """Add Stories scraping tasks"""
+        return await self._enqueue('stories', client_ids, priority)
 
-                    # Update status to processing
-                    supabase.table('clients').update(
-                        {'last_check_status': 'processing'}
-                    ).eq('id', client_id).execute()
+    async def add_analytics_task(self, client_id: int, priority: int = PRIORITY_INTERACTIVE) -> Optional[Dict]:
+        """Add analytics snapshot task"""
+        return (await self.add_analytics_tasks([client_id], priority)).get(client_id)
 
-                    # Call Apify scraper
-                    scrape_result = await self.scraper.get_profile_data(
-                        client['username']
-                    )
+    async def add_analytics_tasks(self, client_ids: List[int], priority: int = PRIORITY_SCHEDULED) -> Dict[int, Dict]:
+        """Add analytics snapshot tasks"""
+        return await self._enqueue('analytics', client_ids, priority)
 
-                    # Update client with results
-                    update_data = {}
-                    if scrape_result["status"] == "success":
-                        data = scrape_result["data"]
-                        update_data = {
-                            'last_post_date': data["last_post_date"],
-                            'days_inactive': int(data["days_inactive"]),
-                            'followers_count': int(data["followers_count"]),
-                            'avg_posting_interval': int(float(data["avg_posting_interval"])),
-                            'status_signal': data["status_signal"],
-                            'post_url': data["post_url"],
-                            'profile_pic_url': data.get("profile_pic_url"),
-                            'last_check_status': 'success',
-                            'last_check_date': datetime.utcnow().isoformat(),
-                            'last_error_message': None
-                        }
-                        logger.info(f"✅ Success: @{client['username']}")
-                    else:
-                        update_data = {
-                            'last_check_status': 'failed',
-                            'last_error_message': scrape_result.get("message", "Unknown error")
-                        }
-                        logger.warning(f"❌ Failed: @{client['username']}")
-
-                    supabase.table('clients').update(update_data).eq('id', client_id).execute()
+    async def instagram_worker(self, worker_id: int):
+        """Worker that leases Instagram jobs in batches and scrapes them with one Apify run"""
+        while True:
+            try:
+                # Wait for jobs from the queue
+                await self._wait_for_actor('instagram')
+                jobs = await self.jobs.wait_and_claim('instagram', self.INSTAGRAM_BATCH_SIZE)
+                job_ids = [job['id'] for job in jobs]
+                client_ids = list(dict.fromkeys(job['client_id'] for job in jobs))
+                # A user asked for these - answer with a fresh scrape, not the cache
+                fresh_ids = {job['client_id'] for job in jobs if job.get('priority') == PRIORITY_INTERACTIVE}
+                logger.info(f"⚙️ Worker {worker_id}: {len(client_ids)} clients {client_ids}")
 
+                try:
+                    async with self.jobs.keep_leased(job_ids):
+                        await self._process_instagram_batch(client_ids, fresh_ids)
+                    await self.jobs.ack(job_ids)
+                except CircuitOpenError as e:
+                    logger.warning(f"Worker {worker_id}: {e} - deferring {len(job_ids)} jobs")
+                    await self.jobs.defer(job_ids, int(e.retry_after) + 1)
+                    self._publish_jobs(jobs, 'instagram', 'deferred')
                 except Exception as e:
                     logger.error(f"Worker {worker_id} DB Error: {e}")
-
-                self.instagram_queue.task_done()
-
-                # Small delay to avoid rate limits
-                await asyncio.sleep(self.INSTAGRAM_DELAY)
+                    await self.jobs.nack(job_ids, str(e))
+                    self._publish_jobs(jobs, 'instagram', 'failed')
 
             except asyncio.CancelledError:
                 break
@@ -183,323 +267,553 @@ class ScrapeScheduler:
                 logger.error(f"Worker {worker_id} Error: {e}")
                 await asyncio.sleep(5)
 
-    async def ads_worker(self, worker_id: int):
-        """Worker that processes Facebook Ads checks"""
-        while True:
-            try:
-                client_id = await self.ads_queue.get()
-                logger.info(f"📢 Ads Worker {worker_id}: #{client_id}")
+    def _publish_jobs(self, jobs: List[dict], task_type: str, status: str):
+        """The same transition for every job of a batch"""
+        for job in jobs:
+            self.events.publish_job(job.get('user_id'), job['client_id'], task_type, status)
 
-                try:
-                    # Fetch client from Supabase
-                    result = supabase.table('clients').select('*').eq('id', client_id).execute()
+    async def _process_instagram_batch(self, client_ids: List[int], fresh_ids: Optional[set] = None):
+        """
+        Scrape a batch of clients with one Apify run. Each username is scraped
+        once (or served from the shared cache, except for clients in fresh_ids -
+        manual refreshes) and the result is saved to every client tracking it,
+        across all users. last_check_date is when the data was scraped.
+        """
+        # Fetch clients from Supabase
+        clients = await db.get_clients(client_ids, columns='id, username, user_id, check_failures')
 
-                    if not result.data or len(result.data) == 0:
-                        self.ads_queue.task_done()
-                        await asyncio.sleep(self.ADS_DELAY)
-                        continue
+        missing = set(client_ids) - {c['id'] for c in clients}
+        for client_id in missing:
+            logger.warning(f"Client {client_id} not found")
+        if not clients:
+            return
 
-                    client = result.data[0]
+        # 'processing' is the leased job itself - pushed, not written
+        self.events.publish_many(clients, 'instagram', 'processing', self.PROCESSING_FIELDS['instagram'])
 
-                    if not client.get('facebook_page_url'):
-                        self.ads_queue.task_done()
-                        await asyncio.sleep(self.ADS_DELAY)
-                        continue
+        # Call Apify scraper once for all distinct, uncached usernames
+        usernames = list(dict.fromkeys(c['username'] for c in clients))
+        fresh_usernames = {c['username'] for c in clients if c['id'] in (fresh_ids or ())}
+        scrape_results = await scrape_cache.get_many(
+            'profile', [u for u in usernames if u not in fresh_usernames]
+        )
+        to_scrape = [u for u in usernames if u not in scrape_results]
+        if to_scrape:
+            fresh_results = await self.scraper.get_profiles_data(to_scrape)
+            await scrape_cache.set_many('profile', fresh_results)
+            scrape_results.update(fresh_results)
+
+        # Consecutive failed checks so far, per username
+        failures = {}
+        for c in clients:
+            failures[c['username']] = max(failures.get(c['username'], 0), c.get('check_failures') or 0)
+
+        # Fan each result out to every client with that username
+        for username in usernames:
+            scrape_result = scrape_results.get(
+                username,
+                {"status": "error", "message": "Missing from batch results"}
+            )
 
-                    # Update status to checking
-                    supabase.table('clients').update(
-                        {'ads_status': 'CHECKING...'}
-                    ).eq('id', client_id).execute()
+            update_data = {}
+            if scrape_result["status"] == "success":
+                data = scrape_result["data"]
+                update_data = {
+                    'last_post_date': data["last_post_date"],
+                    'days_inactive': int(data["days_inactive"]),
+                    'followers_count': int(data["followers_count"]),
+                    'avg_posting_interval': int(float(data["avg_posting_interval"])),
+                    'status_signal': data["status_signal"],
+                    'post_url': data["post_url"],
+                    'profile_pic_url': data.get("profile_pic_url"),
+                    'last_check_status': 'success',
+                    'last_check_date': scrape_result.get('scraped_at') or datetime.utcnow().isoformat(),
+                    'last_error_message': None,
+                    'check_failures': 0
+                }
+                logger.info(f"✅ Success: @{username}")
+            else:
+                # Failed checks are dated too, so the refresh sweep backs off
+                update_data = {
+                    'last_check_status': 'failed',
+                    'last_check_date': datetime.utcnow().isoformat(),
+                    'last_error_message': scrape_result.get("message", "Unknown error"),
+                    'check_failures': failures.get(username, 0) + 1
+                }
+                logger.warning(f"❌ Failed: @{username}")
+
+            try:
+                rows = await db.update_clients_by_username(username, update_data)
+                self.events.publish_many(rows, 'instagram', update_data['last_check_status'], update_data)
+            except Exception as e:
+                logger.error(f"Error saving @{username}: {e}")
 
-                    # Call Apify for ads
-                    ads_result = await self.scraper.check_facebook_ads(
-                        client['facebook_page_url']
+    async def _job_worker(self, task_type: str, worker_id: int, handler):
+        """
+        Generic worker: lease one job of one type at a time, run
+        handler(client_id), ack on success and nack (retry later, or fail
+        after max_attempts) on error. One job per claim keeps a worker from
+        holding jobs it has not started (their lease would run out, and an
+        interactive job would wait behind them); the lease is renewed while
+        the handler runs. Jobs left unacked by a crash are re-leased once
+        their lease expires. Each transition is published on the event bus;
+        a handler may return the client fields it changed.
+        """
+        while True:
+            try:
+                await self._wait_for_actor(task_type)
+                for job in await self.jobs.wait_and_claim(task_type, 1):
+                    logger.info(f"🔧 {task_type} Worker {worker_id}: client #{job['client_id']}")
+                    self.events.publish_job(
+                        job.get('user_id'), job['client_id'], task_type, 'processing',
+                        self.PROCESSING_FIELDS.get(task_type)
                     )
+                    try:
+                        async with self.jobs.keep_leased([job['id']]):
+                            fields = await handler(job['client_id'])
+                        await self.jobs.ack([job['id']])
+                        self.events.publish_job(job.get('user_id'), job['client_id'], task_type, 'success', fields)
+                    except CircuitOpenError as e:
+                        # Actor is down - hand the job back without using an attempt
+                        logger.warning(f"{task_type} Worker {worker_id}: {e} - deferring job")
+                        await self.jobs.defer([job['id']], int(e.retry_after) + 1)
+                        self.events.publish_job(job.get('user_id'), job['client_id'], task_type, 'deferred')
+                    except Exception as e:
+                        logger.error(f"{task_type} Worker {worker_id} Error: {e}")
+                        await self.jobs.nack([job['id']], str(e))
+                        self.events.publish_job(job.get('user_id'), job['client_id'], task_type, 'failed')
 
-                    ads_count = ads_result.get("count", 0)
-                    ads_status = "ACTIVE" if ads_count > 0 else "INACTIVE"
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"{task_type} Worker {worker_id} Fatal Error: {e}")
+                await asyncio.sleep(5)
 
-                    supabase.table('clients').update({
-                        'ads_count': ads_count,
-                        'ads_status': ads_status
-                    }).eq('id', client_id).execute()
+    async def _wait_for_actor(self, task_type: str):
+        """
+        Lease no jobs while the actor they need is behind an open circuit
+        breaker, or while its half-open probe is still running
+        """
+        breaker = self.scraper.breaker(self.TASK_ACTORS[task_type])
+        while breaker.retry_after() > 0 or breaker.probing:
+            await asyncio.sleep(breaker.retry_after() or breaker.probe_wait)
 
-                    logger.info(f"✅ Ads check done: {ads_count}")
+    async def ads_worker(self, worker_id: int):
+        """Worker that processes Facebook Ads checks"""
+        await self._job_worker('ads', worker_id, self._process_ads_job)
+
+    async def _process_ads_job(self, client_id: int) -> Optional[Dict]:
+        """Check Facebook Ads for one client; returns the ads fields it saved"""
+        # Fetch client from Supabase
+        client = await db.get_client(client_id, columns='id, facebook_page_url, ads_status')
+        if not client:
+            return None
+
+        if not client.get('facebook_page_url'):
+            return {'ads_status': client.get('ads_status')}
+
+        # Progress ('CHECKING...') is pushed as an event, not written to the DB
+        # Call Apify for ads
+        ads_result = await self.scraper.check_facebook_ads(
+            client['facebook_page_url']
+        )
 
-                except Exception as e:
-                    logger.error(f"Ads Worker {worker_id} Error: {e}")
+        ads_count = ads_result.get("count", 0)
+        ads_status = "ACTIVE" if ads_count > 0 else "INACTIVE"
 
-                self.ads_queue.task_done()
-                await asyncio.sleep(self.ADS_DELAY)
+        update_data = {
+            'ads_count': ads_count,
+            'ads_status': ads_status
+        }
+        await db.update_client(client_id, update_data)
 
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Ads Worker {worker_id} Error: {e}")
-                await asyncio.sleep(5)
+        logger.info(f"✅ Ads check done: {ads_count}")
+        return update_data
+
+    @staticmethod
+    def _one_per_username(clients: List[dict]) -> List[dict]:
+        """First client of each distinct username (jobs fan out to the rest)"""
+        first_by_username = {}
+        for client in clients:
+            first_by_username.setdefault(client['username'], client)
+        return list(first_by_username.values())
+
+    def _next_refresh_due(self, client: dict) -> Optional[datetime]:
+        """
+        When a client's Instagram data goes stale (UTC), or None if it is due
+        now (never checked, or unknown check date).
+        Interval = half the average posting interval, between REFRESH_MIN_HOURS
+        and the cap for its status_signal. After failed checks it is
+        REFRESH_MIN_HOURS * 2^(failures - 1), capped at REFRESH_FAILED_MAX_HOURS.
+        """
+        if not client.get('last_check_date'):
+            return None
+        try:
+            last_check = datetime.fromisoformat(client['last_check_date'].replace('Z', '+00:00'))
+        except (TypeError, ValueError):
+            return None
+        if last_check.tzinfo is not None:
+            last_check = last_check.astimezone(timezone.utc).replace(tzinfo=None)
+
+        if client.get('last_check_status') == 'failed':
+            failures = max(client.get('check_failures') or 1, 1)
+            hours = min(self.REFRESH_MIN_HOURS * 2 ** (failures - 1), self.REFRESH_FAILED_MAX_HOURS)
+            return last_check + timedelta(hours=hours)
+
+        max_hours = self.REFRESH_MAX_HOURS.get(client.get('status_signal'), self.REFRESH_MAX_HOURS['RED'])
+        posting_hours = (client.get('avg_posting_interval') or 0) * 24 / 2
+        hours = min(max(posting_hours, self.REFRESH_MIN_HOURS), max_hours)
+        return last_check + timedelta(hours=hours)
 
     async def refresh_all_targets(self):
-        """Refresh all tracked clients every 12 hours"""
-        logger.info("⏰ Starting 12H Global Refresh...")
+        """Queue an Instagram refresh for every tracked client that is due"""
+        logger.info("⏰ Checking for stale clients...")
         try:
             # Fetch all tracked clients from Supabase
-            result = supabase.table('clients').select('*').eq('is_tracked', True).execute()
-            clients = result.data if result.data else []
+            clients = await db.list_tracked_clients(
+                columns='id, username, last_check_date, last_check_status, check_failures, '
+                        'avg_posting_interval, status_signal'
+            )
 
+            now = datetime.utcnow()
+            due = []
             for client in clients:
-                await self.add_instagram_task(client['id'])
-                if client.get('facebook_page_url'):
-                    await self.add_ads_task(client['id'])
-
-            logger.info(f"⏰ Queued {len(clients)} clients for refresh")
+                next_due = self._next_refresh_due(client)
+                if next_due is None or next_due <= now:
+                    due.append(client)
+
+            # One Instagram job per username - the worker fans results out
+            jobs = {}
+            if due:
+                jobs = await self.add_instagram_tasks([c['id'] for c in self._one_per_username(due)])
+
+            created = sum(1 for job in jobs.values() if job['created'])
+            logger.info(
+                f"⏰ Queued {created} refresh jobs ({len(jobs) - created} already queued) "
+                f"for {len(due)}/{len(clients)} due clients"
+            )
         except Exception as e:
             logger.error(f"Refresh error: {e}")
 
+    async def refresh_all_ads(self):
+        """Refresh Facebook Ads for all linked clients every 12 hours"""
+        try:
+            clients = await db.list_tracked_clients(columns='id, facebook_page_url')
+            await self.add_ads_tasks([c['id'] for c in clients if c.get('facebook_page_url')])
+        except Exception as e:
+            logger.error(f"Ads refresh error: {e}")
+
     async def stories_worker(self, worker_id: int):
         """Worker that processes Stories scraping and archiving"""
-        while True:
-            try:
-                client_id = await self.stories_queue.get()
-                logger.info(f"📖 Stories Worker {worker_id}: client #{client_id}")
+        await self._job_worker('stories', worker_id, self._process_stories_job)
 
-                try:
-                    # Fetch client from Supabase
-                    result = supabase.table('clients').select('*').eq('id', client_id).execute()
+    async def _process_stories_job(self, client_id: int):
+        """Scrape stories once per username and archive them for every client tracking it"""
+        # Fetch client from Supabase
+        client = await db.get_client(client_id, columns='id, username')
+        if not client:
+            return
 
-                    if not result.data or len(result.data) == 0:
-                        self.stories_queue.task_done()
-                        await asyncio.sleep(self.STORIES_DELAY)
-                        continue
+        # Fetch stories using Apify (shared across tenants)
+        stories_result = await scrape_cache.get('stories', client['username'])
+        if stories_result is None:
+            stories_result = await self.scraper.fetch_instagram_stories(client['username'])
+            await scrape_cache.set('stories', client['username'], stories_result)
 
-                    client = result.data[0]
-
-                    # Fetch stories using Apify
-                    stories_result = await self.scraper.fetch_instagram_stories(client['username'])
-
-                    if stories_result["status"] == "success":
-                        stories = stories_result["stories"]
-                        archived_count = 0
-
-                        for story in stories:
-                            try:
-                                # Check if story already exists
-                                existing = supabase.table('stories').select('id').eq(
-                                    'client_id', client_id
-                                ).eq(
-                                    'instagram_story_id', story['instagram_story_id']
-                                ).execute()
-
-                                if existing.data and len(existing.data) > 0:
-                                    continue  # Skip duplicate
-
-                                # Download and store thumbnail
-                                storage_path = None
-                                if story.get('thumbnail_url'):
-                                    storage_path = await self.scraper.download_and_store_thumbnail(
-                                        story['thumbnail_url'],
-                                        client_id,
-                                        story['instagram_story_id']
-                                    )
-
-                                # Insert story to database
-                                story_data = {
-                                    'client_id': client_id,
-                                    'instagram_story_id': story['instagram_story_id'],
-                                    'thumbnail_url': story.get('thumbnail_url'),
-                                    'thumbnail_storage_path': storage_path,
-                                    'story_type': story.get('story_type', 'image'),
-                                    'story_url': story.get('story_url'),  # Direct link to story media
-                                    'posted_at': story.get('posted_at'),
-                                    'expires_at': story.get('expires_at')
-                                }
+        if stories_result["status"] != "success":
+            return
+
+        targets = await db.list_tracked_clients(
+            columns='id, username, total_stories_archived',
+            username=client['username']
+        )
+        if not targets:
+            return
 
-                                supabase.table('stories').insert(story_data).execute()
-                                archived_count += 1
+        # Stories each client already has - one query for all tenants
+        existing = await db.table('stories').select('client_id, instagram_story_id').in_(
+            'client_id', [t['id'] for t in targets]
+        ).execute()
+        known_ids: Dict[int, set] = {t['id']: set() for t in targets}
+        for row in existing.data or []:
+            known_ids[row['client_id']].add(row['instagram_story_id'])
+
+        # Thumbnails are stored once per username and shared by every tenant
+        stories = list({s['instagram_story_id']: s for s in stories_result["stories"]}.values())
+        needed = [
+            story for story in stories
+            if any(story['instagram_story_id'] not in known for known in known_ids.values())
+        ]
+        storage_paths = await self._store_story_thumbnails(client['username'], needed)
+
+        for target in targets:
+            await self._archive_stories(target, stories, known_ids[target['id']], storage_paths)
+
+    async def _store_story_thumbnails(self, username: str, stories: List[dict]) -> Dict[str, Optional[str]]:
+        """Download and store story thumbnails concurrently: {story_id: storage path}"""
+        semaphore = asyncio.Semaphore(self.THUMBNAIL_CONCURRENCY)
+
+        async def store_thumbnail(story: dict):
+            if not story.get('thumbnail_url'):
+                return None
+            async with semaphore:
+                return await self.scraper.download_and_store_thumbnail(
+                    story['thumbnail_url'],
+                    username,
+                    story['instagram_story_id']
+                )
 
-                                # Update activity calendar
-                                if story.get('posted_at'):
-                                    story_date = datetime.fromisoformat(story['posted_at']).date()
-                                    self._update_activity_calendar(client_id, story_date, is_story=True)
+        paths = await asyncio.gather(*(store_thumbnail(story) for story in stories))
+        return {story['instagram_story_id']: path for story, path in zip(stories, paths)}
 
-                            except Exception as e:
-                                logger.error(f"Error archiving story: {e}")
+    async def _archive_stories(
+        self,
+        client: dict,
+        stories: List[dict],
+        known_ids: set,
+        storage_paths: Dict[str, Optional[str]]
+    ):
+        """
+        Archive new stories for one client and update its stats. Thumbnails
+        were already stored for the username; all new rows are written in
+        one bulk upsert.
+        """
+        new_stories = [story for story in stories if story['instagram_story_id'] not in known_ids]
+
+        # Insert stories to database - ON CONFLICT DO NOTHING on
+        # UNIQUE(client_id, instagram_story_id) returns only inserted rows
+        story_rows = [
+            {
+                'client_id': client['id'],
+                'instagram_story_id': story['instagram_story_id'],
+                'thumbnail_url': story.get('thumbnail_url'),
+                'thumbnail_storage_path': storage_paths.get(story['instagram_story_id']),
+                'story_type': story.get('story_type', 'image'),
+                'story_url': story.get('story_url'),  # Direct link to story media
+                'posted_at': story.get('posted_at'),
+                'expires_at': story.get('expires_at')
+            }
+            for story in new_stories
+        ]
+
+        archived_stories = []
+        if story_rows:
+            try:
+                inserted = await db.table('stories').upsert(
+                    story_rows,
+                    on_conflict='client_id,instagram_story_id',
+                    ignore_duplicates=True
+                ).execute()
+                archived_stories = inserted.data or []
+            except Exception as e:
+                logger.error(f"Error archiving stories: {e}")
 
-                        # Update client stats
-                        update_data = {
-                            'total_stories_archived': (client.get('total_stories_archived', 0) + archived_count)
-                        }
+        # Update activity calendar
+        await self._update_activity_calendar(
+            client['id'],
+            stories_by_date=self._count_by_date(archived_stories)
+        )
+        archived_count = len(archived_stories)
 
-                        if archived_count > 0:
-                            update_data['last_story_date'] = datetime.utcnow().isoformat()
-                            update_data['stories_inactive_days'] = 0
+        # Update client stats
+        update_data = {
+            'total_stories_archived': ((client.get('total_stories_archived') or 0) + archived_count)
+        }
 
-                        supabase.table('clients').update(update_data).eq('id', client_id).execute()
-                        logger.info(f"✅ Archived {archived_count} new stories for @{client['username']}")
+        if archived_count > 0:
+            update_data['last_story_date'] = datetime.utcnow().isoformat()
+            update_data['stories_inactive_days'] = 0
 
-                except Exception as e:
-                    logger.error(f"Stories Worker {worker_id} Error: {e}")
+        await db.update_client(client['id'], update_data)
+        logger.info(f"✅ Archived {archived_count} new stories for @{client['username']} (client #{client['id']})")
 
-                self.stories_queue.task_done()
-                await asyncio.sleep(self.STORIES_DELAY)
+    async def analytics_worker(self, worker_id: int):
+        """Worker that processes analytics snapshot jobs"""
+        await self._job_worker('analytics', worker_id, self._run_analytics_job)
 
-            except asyncio.CancelledError:
-                break
-            except Exception as e:
-                logger.error(f"Stories Worker {worker_id} Fatal Error: {e}")
-                await asyncio.sleep(5)
+    async def _run_analytics_job(self, client_id: int):
+        self.analytics_in_progress[client_id] = datetime.utcnow()
+        try:
+            await self.process_analytics_job(client_id)
+        finally:
+            self.analytics_in_progress.pop(client_id, None)
 
     async def process_analytics_job(self, client_id: int):
-        """Process and save analytics snapshot for a client"""
+        """
+        Process and save analytics snapshot for a client.
+        Posts are scraped once per username and the snapshot is saved for
+        every client tracking that username.
+        Raises when the scrape or a save failed, so the queue worker nacks
+        the job (retry, then failed) instead of acking lost work.
+        """
         try:
             # Fetch client
-            result = supabase.table('clients').select('*').eq('id', client_id).execute()
-            if not result.data or len(result.data) == 0:
+            client = await db.get_client(client_id, columns='id, username')
+            if not client:
                 return
 
-            client = result.data[0]
-
-            # Fetch recent posts (last 20)
-            posts_result = await self.scraper.fetch_instagram_posts_detailed(
-                client['username'],
-                limit=20
-            )
+            # Fetch recent posts (last 20), shared across tenants
+            posts_result = await scrape_cache.get('posts', client['username'])
+            if posts_result is None:
+                posts_result = await self.scraper.fetch_instagram_posts_detailed(
+                    client['username'],
+                    limit=20
+                )
+                await scrape_cache.set('posts', client['username'], posts_result)
 
-            if posts_result["status"] == "success":
-                posts = posts_result["posts"]
+            if posts_result["status"] != "success":
+                raise RuntimeError(posts_result.get("message", "Posts scrape failed"))
 
-                # Save posts to database
-                new_posts_count = 0
-                total_likes = 0
-                total_comments = 0
+            targets = await db.list_tracked_clients(
+                columns='id, username, followers_count, total_posts_tracked',
+                username=client['username']
+            )
+            failed = []
+            for target in targets:
+                try:
+                    await self._save_analytics(target, posts_result["posts"])
+                except Exception as e:
+                    logger.error(f"Analytics save error for client {target['id']}: {e}")
+                    failed.append(target['id'])
+            if failed:
+                raise RuntimeError(f"Analytics save failed for clients {failed}")
 
-                for post in posts:
-                    try:
-                        # Check if post already exists
-                        existing = supabase.table('posts').select('id').eq(
-                            'instagram_post_id', post['instagram_post_id']
-                        ).execute()
-
-                        if not existing.data or len(existing.data) == 0:
-                            # Insert new post
-                            post_data = {
-                                'client_id': client_id,
-                                'instagram_post_id': post['instagram_post_id'],
-                                'post_url': post.get('post_url'),
-                                'thumbnail_url': post.get('thumbnail_url'),
-                                'likes_count': post.get('likes_count', 0),
-                                'comments_count': post.get('comments_count', 0),
-                                'caption': post.get('caption'),
-                                'hashtags': post.get('hashtags', []),
-                                'posted_at': post.get('posted_at')
-                            }
-                            supabase.table('posts').insert(post_data).execute()
-                            new_posts_count += 1
-
-                            # Update activity calendar
-                            if post.get('posted_at'):
-                                post_date = datetime.fromisoformat(post['posted_at']).date()
-                                self._update_activity_calendar(client_id, post_date, is_post=True)
-
-                        total_likes += post.get('likes_count', 0)
-                        total_comments += post.get('comments_count', 0)
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Analytics job error for client {client_id}: {e}")
+            raise
+
+    async def _save_analytics(self, client: dict, posts: List[dict]):
+        """Save posts and today's analytics snapshot for one client"""
+        # Save posts to database - one bulk upsert. ON CONFLICT DO NOTHING
+        # returns only the inserted rows, i.e. the posts that are new.
+        post_rows = {
+            post['instagram_post_id']: {
+                'client_id': client['id'],
+                'instagram_post_id': post['instagram_post_id'],
+                'post_url': post.get('post_url'),
+                'thumbnail_url': post.get('thumbnail_url'),
+                'likes_count': post.get('likes_count', 0),
+                'comments_count': post.get('comments_count', 0),
+                'caption': post.get('caption'),
+                'hashtags': post.get('hashtags', []),
+                'posted_at': post.get('posted_at')
+            }
+            for post in posts
+        }
 
-                    except Exception as e:
-                        logger.error(f"Error saving post: {e}")
-
-                # Calculate analytics
-                avg_likes = round(total_likes / len(posts), 2) if posts else 0
-                avg_comments = round(total_comments / len(posts), 2) if posts else 0
-                followers_count = client.get('followers_count', 0)
-                engagement_rate = self.scraper.calculate_engagement_rate(
-                    avg_likes, avg_comments, followers_count
-                )
+        new_posts = []
+        if post_rows:
+            try:
+                inserted = await db.table('posts').upsert(
+                    list(post_rows.values()),
+                    on_conflict='instagram_post_id',
+                    ignore_duplicates=True
+                ).execute()
+                new_posts = inserted.data or []
+            except Exception as e:
+                logger.error(f"Error saving posts: {e}")
+        new_posts_count = len(new_posts)
 
-                # Log analytics for debugging
-                logger.info(f"📊 Analytics for @{client['username']}:")
-                logger.info(f"   Total posts analyzed: {len(posts)}")
-                logger.info(f"   Total likes: {total_likes} (avg: {avg_likes})")
-                logger.info(f"   Total comments: {total_comments} (avg: {avg_comments})")
-                logger.info(f"   Followers: {followers_count}")
-                logger.info(f"   Engagement Rate: {engagement_rate}%")
-
-                # Calculate posts per day
-                posts_per_day = 0
-                if len(posts) >= 2:
-                    first_post = datetime.fromisoformat(posts[0]['posted_at'])
-                    last_post = datetime.fromisoformat(posts[-1]['posted_at'])
-                    days_diff = (first_post - last_post).days or 1
-                    posts_per_day = round(len(posts) / days_diff, 2)
-
-                # Save analytics snapshot
-                today = date.today()
-                snapshot_data = {
-                    'client_id': client_id,
-                    'followers_count': followers_count,
-                    'following_count': client.get('following_count', 0),
-                    'posts_count': len(posts),
-                    'avg_likes': avg_likes,
-                    'avg_comments': avg_comments,
-                    'engagement_rate': engagement_rate,
-                    'posts_per_day': posts_per_day,
-                    'snapshot_date': str(today)
-                }
+        # Update activity calendar
+        await self._update_activity_calendar(
+            client['id'],
+            posts_by_date=self._count_by_date(new_posts)
+        )
 
-                # Upsert (update or insert)
-                existing_snapshot = supabase.table('analytics_snapshots').select('id').eq(
-                    'client_id', client_id
-                ).eq(
-                    'snapshot_date', str(today)
-                ).execute()
+        total_likes = sum(post.get('likes_count', 0) for post in posts)
+        total_comments = sum(post.get('comments_count', 0) for post in posts)
 
-                if existing_snapshot.data and len(existing_snapshot.data) > 0:
-                    supabase.table('analytics_snapshots').update(snapshot_data).eq(
-                        'id', existing_snapshot.data[0]['id']
-                    ).execute()
-                else:
-                    supabase.table('analytics_snapshots').insert(snapshot_data).execute()
+        # Calculate analytics
+        avg_likes = round(total_likes / len(posts), 2) if posts else 0
+        avg_comments = round(total_comments / len(posts), 2) if posts else 0
+        followers_count = client.get('followers_count', 0)
+        engagement_rate = self.scraper.calculate_engagement_rate(
+            avg_likes, avg_comments, followers_count
+        )
 
-                # Update client stats
-                supabase.table('clients').update({
-                    'total_posts_tracked': client.get('total_posts_tracked', 0) + new_posts_count
-                }).eq('id', client_id).execute()
+        # Log analytics for debugging
+        logger.info(f"📊 Analytics for @{client['username']}:")
+        logger.info(f"   Total posts analyzed: {len(posts)}")
+        logger.info(f"   Total likes: {total_likes} (avg: {avg_likes})")
+        logger.info(f"   Total comments: {total_comments} (avg: {avg_comments})")
+        logger.info(f"   Followers: {followers_count}")
+        logger.info(f"   Engagement Rate: {engagement_rate}%")
+
+        # Calculate posts per day
+        posts_per_day = 0
+        if len(posts) >= 2:
+            first_post = datetime.fromisoformat(posts[0]['posted_at'])
+            last_post = datetime.fromisoformat(posts[-1]['posted_at'])
+            days_diff = (first_post - last_post).days or 1
+            posts_per_day = round(len(posts) / days_diff, 2)
+
+        # Save analytics snapshot
+        today = date.today()
+        snapshot_data = {
+            'client_id': client['id'],
+            'followers_count': followers_count,
+            'following_count': client.get('following_count', 0),
+            'posts_count': len(posts),
+            'avg_likes': avg_likes,
+            'avg_comments': avg_comments,
+            'engagement_rate': engagement_rate,
+            'posts_per_day': posts_per_day,
+            'snapshot_date': str(today)
+        }
 
-                logger.info(f"✅ Analytics saved for @{client['username']}")
+        # Upsert (update or insert) on UNIQUE(client_id, snapshot_date)
+        await db.table('analytics_snapshots').upsert(
+            snapshot_data,
+            on_conflict='client_id,snapshot_date'
+        ).execute()
+
+        # Update client stats
+        await db.update_client(client['id'], {
+            'total_posts_tracked': (client.get('total_posts_tracked') or 0) + new_posts_count
+        })
+
+        logger.info(f"✅ Analytics saved for @{client['username']}")
+
+    @staticmethod
+    def _count_by_date(items: List[dict]) -> Counter:
+        """Number of items per posted_at date"""
+        return Counter(
+            datetime.fromisoformat(item['posted_at']).date()
+            for item in items
+            if item.get('posted_at')
+        )
 
-        except Exception as e:
-            logger.error(f"Analytics job error for client {client_id}: {e}")
+    async def _update_activity_calendar(
+        self,
+        client_id: int,
+        stories_by_date: Optional[Counter] = None,
+        posts_by_date: Optional[Counter] = None
+    ):
+        """
+        Add per-date story/post counts to the activity calendar.
+        One atomic INSERT ... ON CONFLICT DO UPDATE (increment_activity_calendar
+        RPC) per client, so concurrent workers never lose increments.
+        """
+        stories_by_date = stories_by_date or Counter()
+        posts_by_date = posts_by_date or Counter()
+        days = [
+            {
+                'activity_date': str(activity_date),
+                'stories_count': stories_by_date[activity_date],
+                'posts_count': posts_by_date[activity_date]
+            }
+            for activity_date in sorted(set(stories_by_date) | set(posts_by_date))
+        ]
+        if not days:
+            return
 
-    def _update_activity_calendar(self, client_id: int, activity_date: date, is_story=False, is_post=False):
-        """Update activity calendar for a specific date"""
         try:
-            # Check if entry exists
-            existing = supabase.table('activity_calendar').select('*').eq(
-                'client_id', client_id
-            ).eq(
-                'activity_date', str(activity_date)
-            ).execute()
-
-            if existing.data and len(existing.data) > 0:
-                # Update existing
-                entry = existing.data[0]
-                update_data = {
-                    'stories_count': entry.get('stories_count', 0) + (1 if is_story else 0),
-                    'posts_count': entry.get('posts_count', 0) + (1 if is_post else 0),
-                    'has_activity': True
-                }
-                supabase.table('activity_calendar').update(update_data).eq(
-                    'id', entry['id']
-                ).execute()
-            else:
-                # Insert new
-                insert_data = {
-                    'client_id': client_id,
-                    'activity_date': str(activity_date),
-                    'stories_count': 1 if is_story else 0,
-                    'posts_count': 1 if is_post else 0,
-                    'has_activity': True
-                }
-                supabase.table('activity_calendar').insert(insert_data).execute()
-
+            await db.rpc('increment_activity_calendar', {
+                'p_client_id': client_id,
+                'p_days': days
+            }).execute()
         except Exception as e:
             logger.error(f"Error updating activity calendar: {e}")
 
@@ -508,8 +822,9 @@ class ScrapeScheduler:
         logger.info("🔔 Checking inactivity alerts...")
         try:
             # Fetch all tracked clients
-            result = supabase.table('clients').select('*').eq('is_tracked', True).execute()
-            clients = result.data if result.data else []
+            clients = await db.list_tracked_clients(
+                columns='id, user_id, username, last_story_date'
+            )
 
             for client in clients:
                 try:
@@ -520,15 +835,15 @@ class ScrapeScheduler:
                         days_inactive = (datetime.utcnow() - last_date).days
 
                         # Update stories_inactive_days
-                        supabase.table('clients').update({
+                        await db.update_client(client['id'], {
                             'stories_inactive_days': days_inactive
-                        }).eq('id', client['id']).execute()
+                        })
 
                         # Create alert if inactive for 3+ days
                         if days_inactive >= 3:
                             # Check if alert already exists for today
                             today = date.today()
-                            existing_alert = supabase.table('inactivity_alerts').select('id').eq(
+                            existing_alert = await db.table('inactivity_alerts').select('id').eq(
                                 'client_id', client['id']
                             ).eq(
                                 'user_id', client['user_id']
@@ -546,7 +861,7 @@ class ScrapeScheduler:
                                     'is_read': False,
                                     'is_dismissed': False
                                 }
-                                supabase.table('inactivity_alerts').insert(alert_data).execute()
+                                await db.table('inactivity_alerts').insert(alert_data).execute()
                                 logger.info(f"🔔 Alert created: @{client['username']} inactive {days_inactive} days")
 
                 except Exception as e:
@@ -561,37 +876,181 @@ class ScrapeScheduler:
         """Refresh stories for all tracked clients every 20 hours"""
         logger.info("📖 Starting Stories Refresh...")
         try:
-            result = supabase.table('clients').select('*').eq('is_tracked', True).execute()
-            clients = result.data if result.data else []
+            clients = await db.list_tracked_clients(columns='id, username')
 
-            for client in clients:
-                await self.stories_queue.put(client['id'])
+            jobs = await self.add_stories_tasks([c['id'] for c in self._one_per_username(clients)])
 
-            logger.info(f"📖 Queued {len(clients)} clients for stories refresh")
+            created = sum(1 for job in jobs.values() if job['created'])
+            logger.info(
+                f"📖 Queued {created} stories jobs ({len(jobs) - created} already queued) "
+                f"for {len(clients)} tracked clients"
+            )
         except Exception as e:
             logger.error(f"Stories refresh error: {e}")
 
     async def create_daily_analytics(self):
-        """Create analytics snapshots for all tracked clients"""
+        """
+        Create analytics snapshots for all tracked clients.
+        Jobs run on DAILY_ANALYTICS_CONCURRENCY workers behind a global rate
+        limit, stop at the deadline, and the cursor (last client ID with
+        every lower ID done) is persisted so a restart resumes the run.
+        A client whose job fails is handed to the durable analytics queue
+        (retried there) and only then counts as done; if even that fails,
+        the cursor stays before it so a resumed run tries it again.
+        """
+        if self.daily_analytics_progress.get('status') == 'running':
+            logger.warning("📊 Daily analytics already running - skipped")
+            return
+
         logger.info("📊 Creating daily analytics snapshots...")
+        run_date = str(date.today())
+        state = {'run_date': run_date, 'cursor': 0, 'completed': False}
         try:
-            result = supabase.table('clients').select('*').eq('is_tracked', True).execute()
-            clients = result.data if result.data else []
+            saved = await db.get_state('daily_analytics')
+            if saved and saved.get('run_date') == run_date:
+                if saved.get('completed'):
+                    logger.info("📊 Daily analytics already completed today")
+                    return
+                state = saved
+            state['failed'] = []  # clients of this attempt that could not be requeued
+
+            clients = await db.list_tracked_clients(columns='id, username')
+            clients.sort(key=lambda c: c['id'])
+            client_ids = [
+                c['id'] for c in self._one_per_username(clients)
+                if c['id'] > state['cursor']
+            ]
+
+            self.daily_analytics_progress = {
+                'status': 'running',
+                'run_date': run_date,
+                'resumed_after': state['cursor'],
+                'total': len(client_ids),
+                'done': 0,
+                'failed': 0,
+                'started_at': datetime.utcnow().isoformat()
+            }
+            await db.set_state('daily_analytics', state)
+
+            pending = asyncio.Queue()
+            for client_id in client_ids:
+                pending.put_nowait(client_id)
+            finished = set()
+            next_index = 0
+
+            async def run_jobs():
+                nonlocal next_index
+                while not pending.empty():
+                    client_id = pending.get_nowait()
+                    await self.daily_analytics_limiter.acquire()
+                    try:
+                        await self.process_analytics_job(client_id)
+                    except CircuitOpenError as e:
+                        # Scraper is down - retry this client once the breaker probes again
+                        pending.put_nowait(client_id)
+                        await asyncio.sleep(e.retry_after)
+                        continue
+                    except Exception:
+                        # Logged by process_analytics_job - retry it on the queue
+                        self.daily_analytics_progress['failed'] += 1
+                        try:
+                            await self.add_analytics_tasks([client_id], priority=PRIORITY_BACKFILL)
+                        except Exception as e:
+                            logger.error(f"Daily analytics requeue error for client {client_id}: {e}")
+                            state.setdefault('failed', []).append(client_id)
+                            continue
+
+                    finished.add(client_id)
+                    self.daily_analytics_progress['done'] += 1
+
+                    # Advance the cursor over the contiguous finished prefix
+                    while next_index < len(client_ids) and client_ids[next_index] in finished:
+                        state['cursor'] = client_ids[next_index]
+                        next_index += 1
+
+                    if self.daily_analytics_progress['done'] % self.DAILY_ANALYTICS_SAVE_EVERY == 0:
+                        try:
+                            await db.set_state('daily_analytics', state)
+                        except Exception as e:
+                            logger.warning(f"Daily analytics cursor save error: {e}")
+
+            workers = [
+                asyncio.create_task(run_jobs())
+                for _ in range(self.DAILY_ANALYTICS_CONCURRENCY)
+            ]
+            try:
+                await asyncio.wait_for(asyncio.gather(*workers), timeout=self.DAILY_ANALYTICS_DEADLINE)
+                failed = self.daily_analytics_progress['failed']
+                if state.get('failed'):
+                    # Not handed off anywhere - leave the run resumable from the cursor
+                    self.daily_analytics_progress['status'] = 'incomplete'
+                    logger.warning(
+                        f"⚠️ Daily analytics: {len(state['failed'])} clients failed and could not be "
+                        f"requeued {state['failed']} - will resume after client #{state['cursor']}"
+                    )
+                else:
+                    state['completed'] = True
+                    self.daily_analytics_progress['status'] = 'completed'
+                    logger.info(
+                        f"✅ Analytics snapshots created for {len(client_ids) - failed} clients"
+                        f" ({failed} failed, requeued)"
+                    )
+            except asyncio.TimeoutError:
+                self.daily_analytics_progress['status'] = 'deadline'
+                logger.warning(
+                    f"⏱️ Daily analytics deadline reached: "
+                    f"{self.daily_analytics_progress['done']}/{len(client_ids)} done"
+                )
 
-            for client in clients:
-                await self.process_analytics_job(client['id'])
-                await asyncio.sleep(3)  # Small delay between clients
+            await db.set_state('daily_analytics', state)
 
-            logger.info(f"✅ Analytics snapshots created for {len(clients)} clients")
         except Exception as e:
+            self.daily_analytics_progress['status'] = 'failed'
             logger.error(f"Daily analytics error: {e}")
 
-    def get_queue_status(self):
+    async def _resume_daily_analytics(self):
+        """Resume today's daily analytics run if a restart interrupted it"""
+        try:
+            state = await db.get_state('daily_analytics')
+            if state and state.get('run_date') == str(date.today()) and not state.get('completed'):
+                logger.info(f"📊 Resuming daily analytics after client #{state.get('cursor')}")
+                await self.create_daily_analytics()
+        except Exception as e:
+            logger.error(f"Daily analytics resume error: {e}")
+
+    async def get_job_states(self, user_id: int) -> Dict[int, Dict[str, str]]:
+        """Active jobs of one user: {client_id: {task_type: 'queued' | 'processing'}}"""
+        states: Dict[int, Dict[str, str]] = {}
+        for job in await self.jobs.active_for_user(user_id):
+            state = 'processing' if job['status'] == 'leased' else 'queued'
+            states.setdefault(job['client_id'], {})[job['task_type']] = state
+        return states
+
+    def apply_job_states(self, clients: List[dict], states: Dict[int, Dict[str, str]]) -> List[dict]:
+        """Overlay transient job state (queued / processing / CHECKING...) on client rows"""
+        for client in clients:
+            for task_type, state in states.get(client['id'], {}).items():
+                fields = self.PROCESSING_FIELDS if state == 'processing' else self.QUEUED_FIELDS
+                client.update(fields.get(task_type, {}))
+        return clients
+
+    async def get_queue_status(self):
         """Get current queue sizes for monitoring"""
+        sizes = await self.jobs.sizes()
+
+        def pending(task_type: str) -> int:
+            return sizes.get(task_type, {}).get('pending', 0)
+
         return {
-            "instagram_queue": self.instagram_queue.qsize(),
-            "ads_queue": self.ads_queue.qsize(),
-            "stories_queue": self.stories_queue.qsize()
+            "instagram_queue": pending('instagram'),
+            "ads_queue": pending('ads'),
+            "stories_queue": pending('stories'),
+            "analytics_queue": pending('analytics'),
+            "jobs": sizes,
+            "analytics_in_progress": sorted(self.analytics_in_progress),
+            "analytics_workers": self.ANALYTICS_WORKERS,
+            "workers_alive": sum(1 for t in self.worker_tasks if not t.done()),
+            "daily_analytics": self.daily_analytics_progress
         }
 
 
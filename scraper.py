@@ -1,16 +1,49 @@
 import os
 import asyncio
+import functools
 import logging
-import httpx
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, List, Optional
 from apify_client import ApifyClient
 from dotenv import load_dotenv
 from datetime import datetime, timezone
 from supabase import create_client, Client
 
+from http_client import http_pool
+from rate_limit import AdaptiveTokenBucket
+from retry import RetryPolicy, TransientError
+from circuit_breaker import CircuitBreaker, CircuitOpenError
+
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+INSTAGRAM_ACTOR = "apify/instagram-scraper"
+ADS_ACTOR = "curious_coder/facebook-ads-library-scraper"
+STORIES_ACTOR = "datavoyantlab/instagram-story-downloader"
+
+# Apify run starts per second for each actor: (initial, min, max).
+# The actual rate adapts between min and max (AIMD) to errors and timeouts.
+ACTOR_RATES = {
+    INSTAGRAM_ACTOR: (0.5, 0.05, 2.0),
+    ADS_ACTOR: (0.3, 0.03, 1.0),
+    STORIES_ACTOR: (0.2, 0.02, 1.0)
+}
+DEFAULT_ACTOR_RATE = (0.2, 0.02, 1.0)
+
+# Circuit breaker per actor: open after N consecutive failed runs,
+# probe again after the recovery timeout
+BREAKER_FAILURES = int(os.getenv("APIFY_BREAKER_FAILURES", 5))
+BREAKER_RECOVERY_SECS = float(os.getenv("APIFY_BREAKER_RECOVERY_SECS", 300))
+
+
+class ActorRunError(TransientError):
+    """An actor run that finished without SUCCEEDED (FAILED, TIMED-OUT, ABORTED)"""
+
+    def __init__(self, actor_id: str, status: str):
+        super().__init__(f"{actor_id} run {status}")
+        self.status = status
+        self.reason = f"run_{status.lower().replace('-', '_')}"
+
 
 class ApifyScraper:
     def __init__(self):
@@ -22,6 +55,33 @@ class ApifyScraper:
         # Configuration
         self.MAX_RETRIES = 3
         self.TIMEOUT = 120  # seconds
+        self.BATCH_TIMEOUT_PER_PROFILE = 10  # extra seconds per batched username
+        self.DETAILS_RUN_TIMEOUT = 60  # Apify timeout of the profile details run
+        self.POSTS_RUN_TIMEOUT = 90  # Apify timeout of the posts run
+        self.ACTOR_TIMEOUT_MARGIN = 30  # asyncio budget on top of an actor's timeout (start, dataset read)
+        self.APIFY_THREADS = int(os.getenv("APIFY_THREADS", 20))
+        self.STORAGE_THREADS = int(os.getenv("STORAGE_THREADS", 8))
+
+        # ApifyClient is blocking - run every actor call on a bounded pool
+        # so scrapes never freeze the event loop (API, workers, APScheduler)
+        self.executor = ThreadPoolExecutor(
+            max_workers=self.APIFY_THREADS,
+            thread_name_prefix="apify"
+        )
+        # Storage uploads get their own small pool - Apify calls hold their
+        # threads for minutes and would queue thumbnail uploads behind them
+        self.storage_executor = ThreadPoolExecutor(
+            max_workers=self.STORAGE_THREADS,
+            thread_name_prefix="storage"
+        )
+
+        # Shared adaptive rate limit per actor, replaces fixed worker sleeps
+        self.limiters: Dict[str, AdaptiveTokenBucket] = {}
+        self.breakers: Dict[str, CircuitBreaker] = {}
+
+        # Shared retry policy: transient errors back off with full jitter,
+        # permanent ones (4xx, bad input) fail at once
+        self.retry = RetryPolicy(max_attempts=self.MAX_RETRIES)
 
         # Supabase client for storage
         supabase_url = os.getenv("SUPABASE_URL")
@@ -32,45 +92,163 @@ class ApifyScraper:
             logger.warning("Supabase credentials not found - storage features disabled")
             self.supabase = None
 
+    def _run_actor_sync(
+        self,
+        actor_id: str,
+        run_input: Dict[str, Any],
+        timeout_secs: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Blocking Apify call: start the actor and read its dataset.
+        Returns dataset items, or None if the run produced no dataset.
+        Raises ActorRunError when the run did not succeed - call() returns
+        normally for FAILED, TIMED-OUT and ABORTED runs.
+        """
+        run = self.client.actor(actor_id).call(
+            run_input=run_input,
+            timeout_secs=timeout_secs
+        )
+        if run and run.get("status") != "SUCCEEDED":
+            raise ActorRunError(actor_id, run.get("status") or "UNKNOWN")
+        if not run or "defaultDatasetId" not in run:
+            return None
+        return self.client.dataset(run["defaultDatasetId"]).list_items().items
+
+    def _limiter(self, actor_id: str) -> AdaptiveTokenBucket:
+        limiter = self.limiters.get(actor_id)
+        if limiter is None:
+            rate, min_rate, max_rate = ACTOR_RATES.get(actor_id, DEFAULT_ACTOR_RATE)
+            limiter = AdaptiveTokenBucket(rate, min_rate=min_rate, max_rate=max_rate)
+            self.limiters[actor_id] = limiter
+        return limiter
+
+    def rate_metrics(self) -> Dict[str, Any]:
+        """Current adaptive rate per actor (for /queue_status)"""
+        return {actor_id: limiter.metrics() for actor_id, limiter in self.limiters.items()}
+
+    def breaker(self, actor_id: str) -> CircuitBreaker:
+        breaker = self.breakers.get(actor_id)
+        if breaker is None:
+            breaker = CircuitBreaker(
+                actor_id,
+                failure_threshold=BREAKER_FAILURES,
+                recovery_timeout=BREAKER_RECOVERY_SECS
+            )
+            self.breakers[actor_id] = breaker
+        return breaker
+
+    def breaker_metrics(self) -> Dict[str, Any]:
+        """Circuit breaker state per actor (for /queue_status)"""
+        return {actor_id: breaker.metrics() for actor_id, breaker in self.breakers.items()}
+
+    async def _run_actor(
+        self,
+        actor_id: str,
+        run_input: Dict[str, Any],
+        timeout_secs: int
+    ) -> Optional[List[Dict[str, Any]]]:
+        """
+        Run an Apify actor on the bounded executor without blocking the loop.
+        Raises CircuitOpenError while the actor's breaker is open, then waits
+        for its rate limit. Only the run itself is timed (timeout_secs plus
+        ACTOR_TIMEOUT_MARGIN) - waiting for a token never times a job out.
+        Transient errors, timeouts and empty runs count against the actor,
+        successful runs speed it up and close its breaker. Permanent errors
+        (one tenant's bad input) and cancellation (deadline, shutdown) say
+        nothing about the actor - they only give back a claimed probe.
+        """
+        breaker = self.breaker(actor_id)
+        breaker.check()
+
+        limiter = self._limiter(actor_id)
+        try:
+            await limiter.acquire()
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+
+        loop = asyncio.get_running_loop()
+        try:
+            items = await asyncio.wait_for(
+                loop.run_in_executor(
+                    self.executor,
+                    self._run_actor_sync,
+                    actor_id,
+                    run_input,
+                    timeout_secs
+                ),
+                timeout=timeout_secs + self.ACTOR_TIMEOUT_MARGIN
+            )
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except Exception as e:
+            _, transient = self.retry.classify(e)
+            if transient:
+                limiter.on_failure()
+                breaker.on_failure()
+            else:
+                breaker.release()
+            raise
+
+        if items is None:
+            limiter.on_failure()
+            breaker.on_failure()
+        else:
+            limiter.on_success()
+            breaker.on_success()
+        return items
+
     async def get_profile_data(self, username: str) -> Dict[str, Any]:
         """
         Get Instagram profile data with retry logic and timeout.
         Returns dict with status and data/message.
         """
-        for attempt in range(self.MAX_RETRIES):
-            try:
-                logger.info(f"📡 Attempt {attempt+1}: @{username}")
-
-                # Run with timeout
-                result = await asyncio.wait_for(
-                    self._fetch_instagram_profile(username),
-                    timeout=self.TIMEOUT
-                )
-                return result
+        results = await self.get_profiles_data([username])
+        return results[username]
 
-            except asyncio.TimeoutError:
-                logger.warning(f"⏱️ Timeout @{username}, attempt {attempt+1}")
-                if attempt == self.MAX_RETRIES - 1:
-                    return {"status": "error", "message": "Request timeout"}
-                await asyncio.sleep(5)
+    async def get_profiles_data(self, usernames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get Instagram profile data for many usernames with one Apify run
+        for details and one for posts (instead of two runs per username).
+        Returns {username: dict with status and data/message}.
+        """
+        label = ", ".join(f"@{u}" for u in usernames[:3])
+        if len(usernames) > 3:
+            label += f" (+{len(usernames) - 3})"
 
-            except Exception as e:
-                logger.error(f"❌ Error @{username}: {e}")
-                if attempt == self.MAX_RETRIES - 1:
-                    return {"status": "error", "message": str(e)}
-                await asyncio.sleep(5)
+        logger.info(f"📡 Scraping: {label}")
+        try:
+            # Each actor run is timed by _run_actor (after its rate limit wait)
+            return await self.retry.call(
+                lambda: self._fetch_instagram_profiles(usernames),
+                label=label
+            )
+        except CircuitOpenError:
+            raise
+        except asyncio.TimeoutError:
+            return {u: {"status": "error", "message": "Request timeout"} for u in usernames}
+        except Exception as e:
+            return {u: {"status": "error", "message": str(e)} for u in usernames}
 
-        return {"status": "error", "message": "Max retries exceeded"}
+    @staticmethod
+    def _item_username(item: Dict[str, Any]) -> Optional[str]:
+        """Which profile a dataset item belongs to (batched runs mix profiles)"""
+        username = item.get("ownerUsername") or item.get("username")
+        if not username and item.get("inputUrl"):
+            username = item["inputUrl"].rstrip("/").split("/")[-1]
+        return username.lower() if username else None
 
-    async def _fetch_instagram_profile(self, username: str) -> Dict[str, Any]:
-        """Internal method - actual Apify call"""
+    async def _fetch_instagram_profiles(self, usernames: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Internal method - actual Apify calls, results split back per username"""
+        direct_urls = [f"https://www.instagram.com/{u}/" for u in usernames]
+        extra_secs = self.BATCH_TIMEOUT_PER_PROFILE * (len(usernames) - 1)
 
         # Step 1: Get Profile Details (Followers count + Profile Pic)
-        followers_count = 0
-        profile_pic_url = None
+        details = {}
         try:
             profile_input = {
-                "directUrls": [f"https://www.instagram.com/{username}/"],
+                "directUrls": direct_urls,
                 "resultsLimit": 1,
                 "resultsType": "details",
                 "proxy": {
@@ -79,26 +257,24 @@ class ApifyScraper:
                 }
             }
 
-            run_profile = self.client.actor(
-                "apify/instagram-scraper"
-            ).call(run_input=profile_input, timeout_secs=60)
-
-            if run_profile and "defaultDatasetId" in run_profile:
-                profile_items = self.client.dataset(
-                    run_profile["defaultDatasetId"]
-                ).list_items().items
-                if profile_items:
-                    followers_count = profile_items[0].get("followersCount", 0)
-                    profile_pic_url = profile_items[0].get("profilePicUrl") or profile_items[0].get("profilePicUrlHD")
-                    logger.info(f"   👤 Followers: {followers_count}")
-                    if profile_pic_url:
-                        logger.info(f"   🖼️ Profile pic: {profile_pic_url[:50]}...")
+            profile_items = await self._run_actor(
+                INSTAGRAM_ACTOR,
+                profile_input,
+                timeout_secs=self.DETAILS_RUN_TIMEOUT + extra_secs
+            )
+
+            for item in profile_items or []:
+                owner = self._item_username(item)
+                if owner and owner not in details:
+                    details[owner] = item
+        except CircuitOpenError:
+            raise
         except Exception as e:
             logger.warning(f"   ⚠️ Profile details error: {e}")
 
         # Step 2: Get Posts
         run_input = {
-            "directUrls": [f"https://www.instagram.com/{username}/"],
+            "directUrls": direct_urls,
             "resultsLimit": 12,
             "resultsType": "posts",
             "searchType": "hashtag",
@@ -108,15 +284,41 @@ class ApifyScraper:
             }
         }
 
-        run = self.client.actor("apify/instagram-scraper").call(
-            run_input=run_input,
-            timeout_secs=90
+        dataset_items = await self._run_actor(
+            INSTAGRAM_ACTOR,
+            run_input,
+            timeout_secs=self.POSTS_RUN_TIMEOUT + extra_secs
         )
 
-        dataset_items = self.client.dataset(
-            run["defaultDatasetId"]
-        ).list_items().items
+        posts_by_username: Dict[str, List[Dict[str, Any]]] = {}
+        for item in dataset_items or []:
+            owner = self._item_username(item)
+            if owner:
+                posts_by_username.setdefault(owner, []).append(item)
+
+        results = {}
+        for username in usernames:
+            profile = details.get(username.lower(), {})
+            followers_count = profile.get("followersCount", 0)
+            profile_pic_url = profile.get("profilePicUrl") or profile.get("profilePicUrlHD")
+            if profile:
+                logger.info(f"   👤 @{username} followers: {followers_count}")
+
+            results[username] = self._build_profile_result(
+                posts_by_username.get(username.lower(), []),
+                followers_count,
+                profile_pic_url
+            )
+
+        return results
 
+    def _build_profile_result(
+        self,
+        dataset_items: List[Dict[str, Any]],
+        followers_count: int,
+        profile_pic_url: Optional[str]
+    ) -> Dict[str, Any]:
+        """Turn one profile's posts into the activity signal result"""
         if not dataset_items:
             if followers_count > 0:
                 return {
@@ -190,43 +392,40 @@ class ApifyScraper:
 
     async def check_facebook_ads(self, fb_url: str) -> Dict[str, Any]:
         """Check Facebook Ads Library with retry"""
-        for attempt in range(self.MAX_RETRIES):
-            try:
-                input_url = fb_url.replace(
-                    "web.facebook.com", "www.facebook.com"
-                )
-
-                run_input = {
-                    "urls": [{"url": input_url}],
-                    "resultsLimit": 10,
-                    "proxy": {"useApifyProxy": True}
-                }
-
-                run = self.client.actor(
-                    "curious_coder/facebook-ads-library-scraper"
-                ).call(run_input=run_input, timeout_secs=self.TIMEOUT)
-
-                if not run:
-                    return {"count": 0, "status": "error"}
+        input_url = fb_url.replace(
+            "web.facebook.com", "www.facebook.com"
+        )
 
-                items = self.client.dataset(
-                    run["defaultDatasetId"]
-                ).list_items().items
+        run_input = {
+            "urls": [{"url": input_url}],
+            "resultsLimit": 10,
+            "proxy": {"useApifyProxy": True}
+        }
 
-                valid_count = len([
-                    i for i in items
-                    if "ADS_NOT_FOUND" not in str(i)
-                ])
+        try:
+            items = await self.retry.call(
+                lambda: self._run_actor(
+                    ADS_ACTOR,
+                    run_input,
+                    timeout_secs=self.TIMEOUT
+                ),
+                label=f"Ads check {input_url}"
+            )
+        except CircuitOpenError:
+            raise
+        except Exception as e:
+            logger.error(f"Ads check error: {e}")
+            return {"count": 0, "status": "error", "message": str(e)}
 
-                return {"count": valid_count, "status": "success"}
+        if items is None:
+            return {"count": 0, "status": "error"}
 
-            except Exception as e:
-                logger.error(f"Ads check error: {e}")
-                if attempt == self.MAX_RETRIES - 1:
-                    return {"count": 0, "status": "error", "message": str(e)}
-                await asyncio.sleep(3)
+        valid_count = len([
+            i for i in items
+            if "ADS_NOT_FOUND" not in str(i)
+        ])
 
-        return {"count": 0, "status": "error"}
+        return {"count": valid_count, "status": "success"}
 
     async def fetch_instagram_stories(self, username: str) -> Dict[str, Any]:
         """
@@ -249,21 +448,19 @@ class ApifyScraper:
                 }
             }
 
-            run = await asyncio.wait_for(
-                asyncio.to_thread(
-                    self.client.actor("datavoyantlab/instagram-story-downloader").call,
-                    run_input=run_input,
-                    timeout_secs=120
+            items = await self.retry.call(
+                lambda: self._run_actor(
+                    STORIES_ACTOR,
+                    run_input,
+                    timeout_secs=self.TIMEOUT
                 ),
-                timeout=self.TIMEOUT
+                label=f"Stories @{username}"
             )
 
-            if not run or "defaultDatasetId" not in run:
+            if items is None:
                 logger.warning(f"   ⚠️ No dataset returned for @{username}")
                 return {"status": "success", "message": "No active stories", "stories": []}
 
-            items = self.client.dataset(run["defaultDatasetId"]).list_items().items
-
             if not items:
                 logger.info(f"   ℹ️ No active stories for @{username}")
                 return {"status": "success", "message": "No active stories", "stories": []}
@@ -308,6 +505,8 @@ class ApifyScraper:
             logger.info(f"   ✅ Found {len(stories)} ACTIVE stories")
             return {"status": "success", "stories": stories}
 
+        except CircuitOpenError:
+            raise
         except asyncio.TimeoutError:
             logger.error(f"   ⏱️ Timeout fetching stories for @{username}")
             return {"status": "error", "message": "Request timeout", "stories": []}
@@ -403,20 +602,18 @@ class ApifyScraper:
                 }
             }
 
-            run = await asyncio.wait_for(
-                asyncio.to_thread(
-                    self.client.actor("apify/instagram-scraper").call,
-                    run_input=run_input,
-                    timeout_secs=120
+            items = await self.retry.call(
+                lambda: self._run_actor(
+                    INSTAGRAM_ACTOR,
+                    run_input,
+                    timeout_secs=self.TIMEOUT
                 ),
-                timeout=self.TIMEOUT
+                label=f"Posts @{username}"
             )
 
-            if not run or "defaultDatasetId" not in run:
+            if items is None:
                 return {"status": "error", "message": "No dataset returned", "posts": []}
 
-            items = self.client.dataset(run["defaultDatasetId"]).list_items().items
-
             if not items:
                 return {"status": "success", "message": "No posts found", "posts": []}
 
@@ -454,6 +651,8 @@ class ApifyScraper:
             logger.info(f"   ✅ Found {len(posts)} posts")
             return {"status": "success", "posts": posts}
 
+        except CircuitOpenError:
+            raise
         except asyncio.TimeoutError:
             logger.error(f"   ⏱️ Timeout fetching posts for @{username}")
             return {"status": "error", "message": "Request timeout", "posts": []}
@@ -464,11 +663,12 @@ class ApifyScraper:
     async def download_and_store_thumbnail(
         self,
         url: str,
-        client_id: int,
+        folder: str,
         story_id: str
     ) -> Optional[str]:
         """
-        Download thumbnail image and store in Supabase Storage.
+        Download thumbnail image and store it in Supabase Storage under
+        folder/ (the Instagram username - shared by every tenant tracking it).
         Returns storage path or None if failed.
         """
         if not self.supabase:
@@ -476,23 +676,27 @@ class ApifyScraper:
             return None
 
         try:
-            # Download image
-            async with httpx.AsyncClient(timeout=30.0) as http_client:
-                response = await http_client.get(url)
-                response.raise_for_status()
-                image_data = response.content
+            # Download image (shared connection pool)
+            response = await http_pool.client.get(url)
+            response.raise_for_status()
+            image_data = response.content
 
             # Generate unique filename
             file_extension = "jpg"
             if "png" in url.lower():
                 file_extension = "png"
-            filename = f"{client_id}/{story_id}.{file_extension}"
-
-            # Upload to Supabase Storage
-            result = self.supabase.storage.from_("story-thumbnails").upload(
-                path=filename,
-                file=image_data,
-                file_options={"content-type": f"image/{file_extension}"}
+            filename = f"{folder}/{story_id}.{file_extension}"
+
+            # Upload to Supabase Storage (blocking client - run on the storage pool)
+            loop = asyncio.get_running_loop()
+            result = await loop.run_in_executor(
+                self.storage_executor,
+                functools.partial(
+                    self.supabase.storage.from_("story-thumbnails").upload,
+                    path=filename,
+                    file=image_data,
+                    file_options={"content-type": f"image/{file_extension}", "upsert": "true"}
+                )
             )
 
             if result:
@@ -11,7 +11,7 @@ async def test_new_features(client_id: int):
 
     # 1. جلب Stories
     print("📖 Step 1: Fetching stories...")
-    await scheduler.stories_queue.put(client_id)
+    await scheduler.add_stories_tasks([client_id])
     await asyncio.sleep(2)  # انتظر قليلاً لبدء المعالجة
     print("   ✅ Stories job queued\n")
 